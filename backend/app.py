@@ -1,3 +1,6 @@
+import time
+_startup_t0 = time.perf_counter()
+
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 import pandas as pd
@@ -6,24 +9,75 @@ import sys
 import threading
 import json
 from datetime import datetime
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
+from types import MappingProxyType
 import traceback
 import re
+import sqlite3
+import math
 import numpy as np
-import chardet
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 import random
+import zlib
+import copy
+import hmac
+import atexit
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory file locks, every process exports
+    fcntl = None
+
+# chardet, scikit-learn and scipy are imported where they are first used,
+# so a lazy/background start does not pay for them before Flask is up
 
 # Add the current directory to path to import our module
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-# Global variables for user ID management
-user_id_lock = threading.Lock()
+from csv_snapshot import load_snapshot, save_snapshot
+from ranking import top_k, top_k_rows
 
 # Path configuration
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 ACTIVITIES_PATH = os.path.join(BASE_DIR, 'data', 'activities_steps_improved.csv')
 INTERACTIONS_PATH = os.path.join(BASE_DIR, 'data', 'user_dataset_interlinked.csv')
+FEEDBACK_DB_PATH = os.path.join(BASE_DIR, 'data', 'feedback.db')
+
+# New feedback is appended to the interactions CSV (read by the engines) this long after the last
+# write, and never later than FEEDBACK_EXPORT_MAX_WAIT after the first unexported one
+FEEDBACK_EXPORT_DEBOUNCE = float(os.environ.get('FEEDBACK_EXPORT_DEBOUNCE', '2.0'))  # seconds
+FEEDBACK_EXPORT_MAX_WAIT = float(os.environ.get('FEEDBACK_EXPORT_MAX_WAIT', '10.0'))  # seconds
+
+# Hybrid engine execution: 'parallel' runs ML and cosine concurrently, 'sequential' one after the other
+HYBRID_EXECUTION_MODE = os.environ.get('HYBRID_EXECUTION_MODE', 'parallel')
+HYBRID_ENGINE_TIMEOUT = float(os.environ.get('HYBRID_ENGINE_TIMEOUT', '5.0'))  # seconds per engine, from when it starts
+HYBRID_MAX_CONCURRENCY = int(os.environ.get('HYBRID_MAX_CONCURRENCY', '8'))  # requests running engines in parallel
+
+# Batch scoring: max assessments per /batch-recommend call and rows scored per matrix chunk
+BATCH_MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', '5000'))
+BATCH_CHUNK_SIZE = int(os.environ.get('BATCH_CHUNK_SIZE', '256'))
+
+# Response cache for /assess, /hybrid-recommend, /ml-recommend and /recommend
+RESPONSE_CACHE_ENABLED = os.environ.get('RESPONSE_CACHE_ENABLED', '1') not in ('0', 'false', 'False')
+RESPONSE_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', '4096'))
+RESPONSE_CACHE_TTL = float(os.environ.get('RESPONSE_CACHE_TTL', '600'))  # seconds
+
+# Startup: 'eager' builds recommenders on import, 'background' starts a warm-up thread on import,
+# 'lazy' builds them on the first request (or /ready probe) that needs them
+STARTUP_MODE = os.environ.get('STARTUP_MODE', 'eager')
+STARTUP_WAIT_TIMEOUT = float(os.environ.get('STARTUP_WAIT_TIMEOUT', '60'))  # seconds a request waits for warm-up
+
+# Learning engine (recommendation_engine.MentalHealthRecommender): when enabled it is built during warm-up,
+# receives every feedback rating, retrains in the background and reports through /retraining-status
+LEARNING_ENGINE_ENABLED = os.environ.get('LEARNING_ENGINE_ENABLED', '0') in ('1', 'true', 'True')
+
+# Catalog reload: how often requests check the activities CSV's mtime (0 disables), and the token
+# POST /reload-catalog requires in X-Admin-Token (endpoint disabled when unset)
+CATALOG_CHECK_INTERVAL = float(os.environ.get('CATALOG_CHECK_INTERVAL', '30'))  # seconds
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+
+# Per-phase startup timing breakdown (seconds), reported by /ready and /health
+startup_timings = OrderedDict()
+startup_timings['imports'] = round(time.perf_counter() - _startup_t0, 4)
 
 print(f"\n" + "="*60)
 print("🚀 Starting Mental Health Recommender API v4.0")
@@ -40,6 +94,7 @@ print(f"   Files exist: Activities={os.path.exists(ACTIVITIES_PATH)}, Interactio
 def detect_encoding(filepath):
     """Detect file encoding"""
     try:
+        import chardet
         with open(filepath, 'rb') as f:
             raw_data = f.read(10000)
         result = chardet.detect(raw_data)
@@ -50,7 +105,7 @@ def detect_encoding(filepath):
         return 'utf-8'
 
 def safe_read_csv(filepath, encoding=None):
-    """Safely read CSV file with multiple encoding attempts"""
+    """Safely read CSV file (from its binary snapshot when fresh) with multiple encoding attempts"""
     print(f"\n📖 Reading: {os.path.basename(filepath)}")
     
     if not os.path.exists(filepath):
@@ -72,10 +127,17 @@ def safe_read_csv(filepath, encoding=None):
         if enc not in encodings_to_try:
             encodings_to_try.append(enc)
     
+    # The snapshot is keyed by how this function parses the file, not just by the file
+    read_options = {'encodings': encodings_to_try, 'on_bad_lines': 'error'}
+    df = load_snapshot(filepath, read_options=read_options)
+    if df is not None and not df.empty:
+        return df
+    
     for enc in encodings_to_try:
         try:
-            df = pd.read_csv(filepath, encoding=enc)
+            df = pd.read_csv(filepath, encoding=enc, on_bad_lines='error')
             print(f"   ✅ Read with {enc}: {len(df)} rows")
+            save_snapshot(df, filepath, read_options)
             return df
         except:
             continue
@@ -88,29 +150,378 @@ def safe_read_csv(filepath, encoding=None):
         print(f"   ❌ Failed to read: {e}")
         return pd.DataFrame()
 
-def get_next_user_id():
-    """Get the next available user ID from the CSV file"""
-    with user_id_lock:
+class InvalidProfileError(ValueError):
+    """An assessment value is not a finite number"""
+
+def extract_profile(user_input):
+    """Numeric user profile from an assessment payload (raises ValueError/TypeError on bad input)"""
+    if not isinstance(user_input, dict):
+        raise TypeError('Assessment must be a JSON object')
+    profile = {
+        'Stress_Level': float(user_input.get('Stress_Level', 5)),
+        'Anxiety_Score': float(user_input.get('Anxiety_Score', 5)),
+        'Depression_Score': float(user_input.get('Depression_Score', 5)),
+        'Sleep_Hours': float(user_input.get('Sleep_Hours', 7)),
+        'Steps_Per_Day': float(user_input.get('Steps_Per_Day', 5000))
+    }
+    for column, value in profile.items():
+        if not math.isfinite(value):
+            raise InvalidProfileError(f'{column} must be a finite number')
+    return profile
+
+def build_keyword_flags(df, flag_specs):
+    """Build a float32 (rows x flags) matrix of case-insensitive substring matches.
+
+    flag_specs is a list of (name, column, keywords); a flag is 1 when any keyword
+    appears in the row's column. Missing columns match nothing.
+    """
+    flags = np.zeros((len(df), len(flag_specs)), dtype=np.float32)
+    lowered = {}
+    
+    for i, (name, column, keywords) in enumerate(flag_specs):
+        if column not in lowered:
+            if column in df.columns:
+                lowered[column] = df[column].fillna('').astype(str).str.lower()
+            else:
+                lowered[column] = pd.Series('', index=df.index, dtype=object)
+        
+        text = lowered[column]
+        matched = np.zeros(len(df), dtype=bool)
+        for keyword in keywords:
+            matched |= text.str.contains(keyword, regex=False).to_numpy(dtype=bool)
+        flags[:, i] = matched
+    
+    return flags
+
+# ============================================================
+# FEEDBACK STORE - APPEND-ONLY SQLITE (WAL)
+# ============================================================
+
+INTERACTION_COLUMNS = [
+    'User_ID', 'Stress_Level', 'Anxiety_Score', 'Depression_Score', 'Sleep_Hours',
+    'Steps_Per_Day', 'Mood_Description', 'Recommended_Activity_ID', 'Activity_Rating', 'Timestamp'
+]
+
+class FeedbackStore:
+    """Append-only store for activity feedback rows.
+
+    Each rating is a single INSERT into a WAL-mode SQLite table, so writes
+    cost O(1) regardless of history size and are serialized safely across
+    worker processes. The store is the source of truth: the interactions CSV
+    is imported once (migration) and afterwards only written from the store.
+    One process at a time (holder of a lock on <csv>.lock) appends new rows
+    to the CSV for the recommenders, so other workers' writes never wait on it.
+    """
+
+    def __init__(self, db_path, csv_path=None, export_debounce=FEEDBACK_EXPORT_DEBOUNCE,
+                 export_max_wait=FEEDBACK_EXPORT_MAX_WAIT):
+        self.db_path = db_path
+        self.csv_path = csv_path
+        self.export_debounce = export_debounce
+        self.export_max_wait = export_max_wait
+        self._local = threading.local()
+        self._export_lock_file = None
+        self._export_stop = threading.Event()
+        self._export_thread = None
+        self._setup()
+        if csv_path:
+            self.sync_from_csv(csv_path)
+            self._export_thread = threading.Thread(target=self._export_loop, name='feedback-export', daemon=True)
+            self._export_thread.start()
+            atexit.register(self.flush_export)
+
+    def _connect(self):
+        """Get this thread's connection (one per thread, reused across calls)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA busy_timeout=30000')
+            self._local.conn = conn
+        return conn
+
+    def _setup(self):
+        """Create tables if needed"""
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = self._connect()
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS interactions (
+            row_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            User_ID INTEGER,
+            Stress_Level REAL,
+            Anxiety_Score REAL,
+            Depression_Score REAL,
+            Sleep_Hours REAL,
+            Steps_Per_Day REAL,
+            Mood_Description TEXT,
+            Recommended_Activity_ID INTEGER,
+            Activity_Rating REAL,
+            Timestamp TEXT
+        )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_interactions_user ON interactions(User_ID)')
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS store_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+        ''')
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS id_sequence (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+        ''')
+
+    @staticmethod
+    def _csv_signature(csv_path):
+        """(size, mtime_ns) of the CSV as a string, or None if it doesn't exist"""
+        if not os.path.exists(csv_path):
+            return None
+        stat = os.stat(csv_path)
+        return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+    def _get_meta(self, conn, key):
+        result = conn.execute("SELECT value FROM store_meta WHERE key = ?", (key,)).fetchone()
+        return result[0] if result else None
+
+    def _set_meta(self, conn, key, value):
+        conn.execute("INSERT OR REPLACE INTO store_meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def _insert_rows(self, conn, rows):
+        conn.executemany(
+            f"INSERT INTO interactions ({', '.join(INTERACTION_COLUMNS)}) "
+            f"VALUES ({', '.join('?' * len(INTERACTION_COLUMNS))})",
+            rows
+        )
+
+    def sync_from_csv(self, csv_path):
+        """Import the interactions CSV into the store once (migration); returns rows imported.
+
+        Later changes to the CSV are never imported: the exporter rewrites a CSV
+        that no longer matches what it last wrote from the store.
+        """
+        conn = self._connect()
+        # BEGIN IMMEDIATE takes the write lock, so only one worker migrates
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if self._get_meta(conn, 'csv_migrated'):
+                conn.execute('COMMIT')
+                return 0
+
+            df = safe_read_csv(csv_path) if os.path.exists(csv_path) else pd.DataFrame()
+            df = df.reindex(columns=INTERACTION_COLUMNS)
+            df = df.astype(object).where(pd.notna(df), None)
+            rows = [tuple(r) for r in df.itertuples(index=False, name=None)]
+            self._insert_rows(conn, rows)
+
+            self._set_meta(conn, 'csv_migrated', datetime.now().isoformat())
+            self._set_meta(conn, 'csv_signature', self._csv_signature(csv_path))
+            self._set_meta(conn, 'csv_row_id', self._max_row_id(conn))
+            self._seed_user_id_sequence(conn)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+        print(f"   ✅ Imported {len(rows)} interactions from {os.path.basename(csv_path)}")
+        return len(rows)
+
+    def append(self, row):
+        """Append one interaction row (the exporter mirrors it to the CSV shortly after)"""
+        values = tuple(row.get(col) for col in INTERACTION_COLUMNS)
+        self._insert_rows(self._connect(), [values])
+
+    def _seed_user_id_sequence(self, conn):
+        """Keep the user ID counter at or after the highest stored User_ID"""
+        conn.execute('''
+        INSERT OR IGNORE INTO id_sequence (name, value)
+        SELECT 'user_id', COALESCE(MAX(User_ID), 0) FROM interactions
+        ''')
+        conn.execute('''
+        UPDATE id_sequence SET value = MAX(value, (SELECT COALESCE(MAX(User_ID), 0) FROM interactions))
+        WHERE name = 'user_id'
+        ''')
+
+    def allocate_user_id(self):
+        """Atomically reserve the next user ID (unique across processes)"""
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
         try:
-            if os.path.exists(INTERACTIONS_PATH):
-                df = safe_read_csv(INTERACTIONS_PATH)
-                if 'User_ID' in df.columns and len(df) > 0:
-                    df['User_ID'] = pd.to_numeric(df['User_ID'], errors='coerce')
-                    max_id = df['User_ID'].max()
-                    if pd.isna(max_id):
-                        return 1
-                    return int(max_id) + 1
-            return 1
+            self._seed_user_id_sequence(conn)
+            conn.execute("UPDATE id_sequence SET value = value + 1 WHERE name = 'user_id'")
+            user_id = conn.execute("SELECT value FROM id_sequence WHERE name = 'user_id'").fetchone()[0]
+            conn.execute('COMMIT')
+            return int(user_id)
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def peek_user_id(self):
+        """Next user ID that allocate_user_id would hand out (not reserved)"""
+        result = self._connect().execute("SELECT value FROM id_sequence WHERE name = 'user_id'").fetchone()
+        if result is None:
+            return self.max_user_id() + 1
+        return int(result[0]) + 1
+
+    def max_user_id(self):
+        """Highest User_ID stored so far (0 if empty)"""
+        result = self._connect().execute('SELECT MAX(User_ID) FROM interactions').fetchone()
+        return int(result[0]) if result and result[0] is not None else 0
+
+    def count(self):
+        """Number of stored interactions"""
+        return self._connect().execute('SELECT COUNT(*) FROM interactions').fetchone()[0]
+
+    def to_dataframe(self):
+        """Load all interactions in insertion order"""
+        return pd.read_sql_query(
+            f"SELECT {', '.join(INTERACTION_COLUMNS)} FROM interactions ORDER BY row_id",
+            self._connect()
+        )
+
+    def _max_row_id(self, conn):
+        return conn.execute('SELECT COALESCE(MAX(row_id), 0) FROM interactions').fetchone()[0]
+
+    @staticmethod
+    def _ends_with_newline(path):
+        with open(path, 'rb') as f:
+            if f.seek(0, os.SEEK_END) == 0:
+                return True
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b'\n'
+
+    def _acquire_export_lock(self):
+        """Try to become this CSV's exporter (non-blocking); the lock is held until the process exits"""
+        if self._export_lock_file is not None or fcntl is None:
+            return True
+        lock_file = open(f"{self.csv_path}.lock", 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._export_lock_file = lock_file
+        return True
+
+    def _export_pending(self):
+        """True if the CSV lacks stored rows or was changed outside the store"""
+        conn = self._connect()
+        if self._get_meta(conn, 'csv_signature') != self._csv_signature(self.csv_path):
+            return True
+        return self._max_row_id(conn) > int(self._get_meta(conn, 'csv_row_id') or 0)
+
+    def export_csv(self):
+        """Bring the CSV up to date (exporter only); returns the number of rows written.
+
+        Rows stored since the last export are appended. A CSV that no longer
+        matches the recorded signature (edited, restored by a deploy, or left
+        half-written by a crash) is rewritten from the store instead.
+        """
+        conn = self._connect()
+        exported_row_id = int(self._get_meta(conn, 'csv_row_id') or 0)
+        signature = self._csv_signature(self.csv_path)
+        rewrite = signature is None or self._get_meta(conn, 'csv_signature') != signature
+        df = pd.read_sql_query(
+            f"SELECT row_id, {', '.join(INTERACTION_COLUMNS)} FROM interactions WHERE row_id > ? ORDER BY row_id",
+            conn, params=(0 if rewrite else exported_row_id,)
+        )
+        if df.empty and not rewrite:
+            return 0
+
+        if rewrite:
+            tmp_path = f"{self.csv_path}.tmp-{os.getpid()}"
+            df[INTERACTION_COLUMNS].to_csv(tmp_path, index=False, encoding='utf-8')
+            os.replace(tmp_path, self.csv_path)
+        else:
+            needs_newline = not self._ends_with_newline(self.csv_path)
+            with open(self.csv_path, 'a', encoding='utf-8', newline='') as f:
+                if needs_newline:
+                    f.write('\n')
+                df[INTERACTION_COLUMNS].to_csv(f, header=False, index=False)
+
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            self._set_meta(conn, 'csv_signature', self._csv_signature(self.csv_path))
+            if not df.empty:
+                self._set_meta(conn, 'csv_row_id', int(df['row_id'].max()))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return len(df)
+
+    def _export_loop(self):
+        """Exporter: append new rows once writes pause for export_debounce, or after export_max_wait"""
+        poll = max(0.05, min(self.export_debounce, self.export_max_wait) / 4)
+        seen_row_id = None
+        changed_at = pending_since = None
+        while not self._export_stop.wait(poll):
+            try:
+                if not self._acquire_export_lock() or not self._export_pending():
+                    pending_since = None
+                    continue
+                now = time.monotonic()
+                row_id = self._max_row_id(self._connect())
+                if row_id != seen_row_id or pending_since is None:
+                    seen_row_id, changed_at = row_id, now
+                    pending_since = pending_since or now
+                if now - changed_at >= self.export_debounce or now - pending_since >= self.export_max_wait:
+                    pending_since = None
+                    self._run_export()
+            except Exception as e:
+                print(f"⚠ Feedback export check failed: {e}")
+
+    def _run_export(self):
+        try:
+            count = self.export_csv()
+            if count:
+                print(f"   💾 Exported {count} interactions to {os.path.basename(self.csv_path)}")
         except Exception as e:
-            print(f"⚠ Error getting next user ID: {e}")
-            return 1
+            print(f"⚠ Could not export interactions CSV: {e}")
+
+    def flush_export(self):
+        """Export pending rows now if this process is the exporter (used at shutdown)"""
+        self._export_stop.set()
+        if self._export_thread is not None:
+            self._export_thread.join(timeout=5)
+        if self._export_lock_file is not None or fcntl is None:
+            self._run_export()
+
+_phase_t0 = time.perf_counter()
+try:
+    feedback_store = FeedbackStore(FEEDBACK_DB_PATH, INTERACTIONS_PATH)
+    print(f"✅ Feedback store ready: {feedback_store.count()} interactions")
+except Exception as e:
+    print(f"❌ Could not open feedback store: {e}")
+    traceback.print_exc()
+    feedback_store = None
+startup_timings['feedback_store'] = round(time.perf_counter() - _phase_t0, 4)
 
-def insert_activity_rating(stress_level, anxiety_score, depression_score, sleep_hours, 
+def get_next_user_id():
+    """Get the next available user ID from the persisted counter (not reserved)"""
+    try:
+        if feedback_store is not None:
+            return feedback_store.peek_user_id()
+        return 1
+    except Exception as e:
+        print(f"⚠ Error getting next user ID: {e}")
+        return 1
+
+def allocate_user_id():
+    """Reserve a new unique user ID"""
+    return feedback_store.allocate_user_id()
+
+def insert_activity_rating(stress_level, anxiety_score, depression_score, sleep_hours,
                           steps_per_day, mood_description, recommended_activity_id, activity_rating):
-    """Insert a new activity rating into the CSV file"""
+    """Append a new activity rating to the feedback store"""
     try:
-        user_id = get_next_user_id()
-        
+        if feedback_store is None:
+            return False, "Feedback store not available", None
+
+        user_id = allocate_user_id()
+
         new_row = {
             'User_ID': user_id,
             'Stress_Level': float(stress_level),
@@ -123,21 +534,9 @@ def insert_activity_rating(stress_level, anxiety_score, depression_score, sleep_
             'Activity_Rating': float(activity_rating),
             'Timestamp': datetime.now().isoformat()
         }
-        
-        new_df = pd.DataFrame([new_row])
-        
-        if os.path.exists(INTERACTIONS_PATH):
-            try:
-                existing_df = safe_read_csv(INTERACTIONS_PATH)
-                combined_df = pd.concat([existing_df, new_df], ignore_index=True)
-            except Exception as e:
-                print(f"⚠ Error reading existing CSV: {e}")
-                combined_df = new_df
-        else:
-            combined_df = new_df
-        
-        combined_df.to_csv(INTERACTIONS_PATH, index=False, encoding='utf-8')
-        
+
+        feedback_store.append(new_row)
+
         print(f"✅ Saved rating for user {user_id}, activity {recommended_activity_id}")
         return True, "Rating saved successfully", user_id
         
@@ -389,6 +788,19 @@ class ActivityFormatter:
         else:
             return f'{activity_type} activity for overall mental wellbeing'
     
+    @staticmethod
+    def normalize_match_score(match_score):
+        """Clamp a raw match score to the displayed 65-98% range"""
+        if match_score is None:
+            match_percentage = 80.0
+        elif isinstance(match_score, (int, float)):
+            match_percentage = float(match_score)
+        else:
+            match_percentage = 80.0
+        
+        # Ensure match is reasonable
+        return max(65.0, min(98.0, match_percentage))
+    
     @staticmethod
     def format_activity(activity_row, match_score=None, method='ml'):
         """Format activity row for correct card display"""
@@ -439,15 +851,7 @@ class ActivityFormatter:
             formatted_benefits = '- Promotes mental wellness\n- Reduces stress\n- Improves mood'
         
         # Calculate match percentage
-        if match_score is None:
-            match_percentage = 80.0
-        elif isinstance(match_score, (int, float)):
-            match_percentage = float(match_score)
-        else:
-            match_percentage = 80.0
-        
-        # Ensure match is reasonable
-        match_percentage = max(65.0, min(98.0, match_percentage))
+        match_percentage = ActivityFormatter.normalize_match_score(match_score)
         
         # Create the formatted activity object
         formatted = {
@@ -477,6 +881,62 @@ class ActivityFormatter:
         
         return formatted
 
+# ============================================================
+# ACTIVITY CARD CACHE
+# ============================================================
+
+class ActivityCardCache:
+    """Immutable formatted cards for every activity in the catalog.
+
+    The text fields of a card (title, benefits, description, video link...)
+    only depend on the activity row, so they are built once per catalog.
+    Per request only match_score, match_percentage and method are overlaid.
+    """
+    
+    # Fields that change per request and are not part of the cached card
+    REQUEST_FIELDS = ('match_score', 'match_percentage', 'method')
+    
+    def __init__(self, activities_df):
+        self.version = 0
+        self.rebuild(activities_df)
+    
+    def rebuild(self, activities_df):
+        """(Re)build all cards; call whenever the activities catalog is reloaded"""
+        cards = []
+        positions = {}
+        
+        for position, (_, row) in enumerate(activities_df.iterrows()):
+            card = ActivityFormatter.format_activity(row)
+            for field in self.REQUEST_FIELDS:
+                card.pop(field, None)
+            cards.append(MappingProxyType(card))
+            positions.setdefault(card['id'], position)
+        
+        # Swap in complete structures so concurrent readers never see a partial build
+        self._cards = tuple(cards)
+        self._positions = positions
+        self.version += 1
+        print(f"   ✅ Built {len(cards)} activity cards (catalog version {self.version})")
+    
+    def __len__(self):
+        return len(self._cards)
+    
+    def card_at(self, position, match_score=None, method='ml'):
+        """Card for the activity at a row position, with per-request fields overlaid"""
+        card = dict(self._cards[position])
+        match_percentage = ActivityFormatter.normalize_match_score(match_score)
+        card['match_score'] = match_percentage
+        card['match_percentage'] = f"{match_percentage:.1f}%"
+        card['method'] = method
+        return card
+    
+    def card_for(self, activity_id, match_score=None, method='ml'):
+        """Card for an Activity_ID, or None if the catalog does not contain it"""
+        position = self._positions.get(int(activity_id))
+        if position is None:
+            return None
+        return self.card_at(position, match_score, method)
+
 # ============================================================
 # UPDATED COSINE RECOMMENDER WITH SCORE-BASED PERSONALIZATION
 # ============================================================
@@ -484,11 +944,35 @@ class ActivityFormatter:
 class ImprovedCosineRecommender:
     """Cosine similarity recommender with correct formatting and score-based personalization"""
     
-    def __init__(self, activities_df):
+    # Attribute flags used by the score adjustments: (column, source field, keywords matched with OR)
+    ADJUSTMENT_FLAGS = [
+        ('b_stress', 'Benefits', ['stress']),
+        ('c_stress', 'Activity_Category', ['stress']),
+        ('b_anxiety', 'Benefits', ['anxiety']),
+        ('c_anxiety', 'Activity_Category', ['anxiety']),
+        ('b_depression_mood', 'Benefits', ['depression', 'mood']),
+        ('c_mood_depression', 'Activity_Category', ['mood', 'depression']),
+        ('b_sleep', 'Benefits', ['sleep']),
+        ('i_high', 'Intensity_Level', ['high']),
+        ('i_low', 'Intensity_Level', ['low']),
+        ('i_medium', 'Intensity_Level', ['medium']),
+        ('i_low_medium', 'Intensity_Level', ['low', 'medium']),
+    ]
+    
+    def __init__(self, activities_df, user_vector_cache_size=1024, card_cache=None):
         self.activities = activities_df
         self.vectorizer = None
         self.activity_vectors = None
         self.formatter = ActivityFormatter()
+        self.card_cache = card_cache if card_cache is not None else ActivityCardCache(activities_df)
+        
+        # LRU cache of transformed user documents, keyed by the profile parts the document depends on
+        self.user_vector_cache_size = user_vector_cache_size
+        self._user_vector_cache = OrderedDict()
+        self._user_vector_lock = threading.Lock()
+        self.user_vector_hits = 0
+        self.user_vector_misses = 0
+        
         self._prepare_features()
     
     def _prepare_features(self):
@@ -515,125 +999,185 @@ class ImprovedCosineRecommender:
             
             text_features.append(combined_text.lower())
         
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        
         self.vectorizer = TfidfVectorizer(
             stop_words='english',
             max_features=500,
             ngram_range=(1, 2)
         )
         self.activity_vectors = self.vectorizer.fit_transform(text_features)
+        self.clear_user_vector_cache()
+        
+        self._prepare_adjustment_flags()
         
         print(f"   ✅ Created vectors for {len(self.activities)} activities")
     
-    def get_recommendations(self, user_profile, top_n=5):
-        """Get cosine similarity recommendations with score-based personalization"""
-        if self.activity_vectors is None:
-            return []
+    def _prepare_adjustment_flags(self):
+        """Precompute the activity x attribute-flag matrix for score adjustments"""
+        self.adjustment_index = {name: i for i, (name, _, _) in enumerate(self.ADJUSTMENT_FLAGS)}
+        self.adjustment_flags = build_keyword_flags(self.activities, self.ADJUSTMENT_FLAGS)
+    
+    def _adjustment_log_weights(self, stress, anxiety, depression, sleep):
+        """Log of each flag's multiplier for one user profile"""
+        factors = np.ones(len(self.ADJUSTMENT_FLAGS), dtype=np.float64)
+        f = self.adjustment_index
         
-        # Ensure all values are floats
-        stress = float(user_profile.get('Stress_Level', 5))
-        anxiety = float(user_profile.get('Anxiety_Score', 5))
-        depression = float(user_profile.get('Depression_Score', 5))
-        sleep = float(user_profile.get('Sleep_Hours', 7))
-        steps = float(user_profile.get('Steps_Per_Day', 5000))
+        # Adjust based on user scores
+        if stress > 5:
+            factors[f['b_stress']] *= 1.0 + (stress * 0.05)
+            factors[f['c_stress']] *= 1.0 + (stress * 0.03)
         
-        print(f"   Creating personalized vector for Stress={stress}, Anxiety={anxiety}, Depression={depression}")
+        if anxiety > 5:
+            factors[f['b_anxiety']] *= 1.0 + (anxiety * 0.04)
+            factors[f['c_anxiety']] *= 1.0 + (anxiety * 0.03)
+        
+        if depression > 5:
+            factors[f['b_depression_mood']] *= 1.0 + (depression * 0.05)
+            factors[f['c_mood_depression']] *= 1.0 + (depression * 0.03)
+        
+        # Adjust for sleep
+        if sleep < 6:
+            factors[f['b_sleep']] *= 1.3
+        
+        # Adjust intensity preferences
+        if depression > 6:
+            factors[f['i_high']] *= 1.2  # High energy for depression
+        if anxiety > 6:
+            factors[f['i_low']] *= 1.2  # Low intensity for anxiety
+        # 'low' intensity when stress > 6, or any 'medium' intensity
+        if stress > 6:
+            factors[f['i_low_medium']] *= 1.1
+        else:
+            factors[f['i_medium']] *= 1.1
         
+        return np.log(factors)
+    
+    @staticmethod
+    def _user_document_key(stress, anxiety, depression, sleep, steps):
+        """Everything the keyword user document depends on"""
+        return (
+            int(stress) if stress > 4 else None,
+            int(anxiety) if anxiety > 4 else None,
+            int(depression) if depression > 4 else None,
+            sleep < 6,
+            steps < 3000,
+            stress > 7 or anxiety > 7 or depression > 7
+        )
+    
+    @staticmethod
+    def _build_user_keywords(stress_key, anxiety_key, depression_key, poor_sleep, low_steps, high_scores):
+        """Keyword list for a user document (scores already reduced to their cache key)"""
         # Add keywords based on SCORE VALUES (not just thresholds)
         user_keywords = []
         
         # Stress keywords (weighted by stress level)
-        if stress > 4:
-            user_keywords.extend(['stress relief'] * int(stress))
-            user_keywords.extend(['calm'] * int(stress))
+        if stress_key is not None:
+            user_keywords.extend(['stress relief'] * stress_key)
+            user_keywords.extend(['calm'] * stress_key)
             user_keywords.extend(['relaxation', 'tension release'])
         
         # Anxiety keywords (weighted by anxiety level)
-        if anxiety > 4:
-            user_keywords.extend(['anxiety relief'] * int(anxiety))
-            user_keywords.extend(['calm mind'] * int(anxiety))
+        if anxiety_key is not None:
+            user_keywords.extend(['anxiety relief'] * anxiety_key)
+            user_keywords.extend(['calm mind'] * anxiety_key)
             user_keywords.extend(['grounding', 'worried', 'panic'])
         
         # Depression keywords (weighted by depression level)
-        if depression > 4:
-            user_keywords.extend(['mood boost'] * int(depression))
-            user_keywords.extend(['energy'] * int(depression))
+        if depression_key is not None:
+            user_keywords.extend(['mood boost'] * depression_key)
+            user_keywords.extend(['energy'] * depression_key)
             user_keywords.extend(['motivation', 'depression', 'sad'])
         
         # Sleep keywords
-        if sleep < 6:
+        if poor_sleep:
             user_keywords.extend(['sleep improvement', 'insomnia', 'rest', 'relax'])
         
         # Activity level keywords
-        if steps < 3000:
+        if low_steps:
             user_keywords.extend(['gentle exercise', 'walking', 'beginner', 'low impact'])
         else:
             user_keywords.extend(['active', 'energetic', 'vigorous', 'challenging'])
         
         # Add mood keywords based on scores
-        if stress > 7 or anxiety > 7 or depression > 7:
+        if high_scores:
             user_keywords.extend(['mental health support', 'emotional wellness', 'self-care'])
         
         if not user_keywords:
             user_keywords = ['mental health', 'wellness', 'self-care']
         
+        return user_keywords
+    
+    def _get_user_vector(self, stress, anxiety, depression, sleep, steps):
+        """Sparse TF-IDF vector for the user's keyword document (LRU cached)"""
+        key = self._user_document_key(stress, anxiety, depression, sleep, steps)
+        
+        with self._user_vector_lock:
+            user_vector = self._user_vector_cache.get(key)
+            if user_vector is not None:
+                self._user_vector_cache.move_to_end(key)
+                self.user_vector_hits += 1
+                return user_vector
+            self.user_vector_misses += 1
+        
+        print(f"   Creating personalized vector for Stress={stress}, Anxiety={anxiety}, Depression={depression}")
+        user_keywords = self._build_user_keywords(*key)
+        
         # Create weighted user document
         user_doc = ' '.join(user_keywords)
         print(f"   User document keywords: {set(user_keywords)}")
         
         user_vector = self.vectorizer.transform([user_doc])
         
+        with self._user_vector_lock:
+            self._user_vector_cache[key] = user_vector
+            self._user_vector_cache.move_to_end(key)
+            while len(self._user_vector_cache) > self.user_vector_cache_size:
+                self._user_vector_cache.popitem(last=False)
+        
+        return user_vector
+    
+    def clear_user_vector_cache(self):
+        """Drop cached user vectors (call after refitting the vectorizer)"""
+        with self._user_vector_lock:
+            self._user_vector_cache.clear()
+    
+    def user_vector_cache_stats(self):
+        """Hit/miss counters for the user vector cache"""
+        with self._user_vector_lock:
+            total = self.user_vector_hits + self.user_vector_misses
+            return {
+                'size': len(self._user_vector_cache),
+                'max_size': self.user_vector_cache_size,
+                'hits': self.user_vector_hits,
+                'misses': self.user_vector_misses,
+                'hit_rate': round(self.user_vector_hits / total, 4) if total else 0.0
+            }
+    
+    def get_recommendations(self, user_profile, top_n=5):
+        """Get cosine similarity recommendations with score-based personalization"""
+        if self.activity_vectors is None:
+            return []
+        
+        # Ensure all values are floats
+        stress = float(user_profile.get('Stress_Level', 5))
+        anxiety = float(user_profile.get('Anxiety_Score', 5))
+        depression = float(user_profile.get('Depression_Score', 5))
+        sleep = float(user_profile.get('Sleep_Hours', 7))
+        steps = float(user_profile.get('Steps_Per_Day', 5000))
+        
+        user_vector = self._get_user_vector(stress, anxiety, depression, sleep, steps)
+        
         # Calculate similarities
+        from sklearn.metrics.pairwise import cosine_similarity
         similarities = cosine_similarity(user_vector, self.activity_vectors)[0]
         
-        # Apply score-based adjustments to similarities
-        for i in range(len(similarities)):
-            activity = self.activities.iloc[i]
-            benefits = str(activity.get('Benefits', '')).lower()
-            intensity = str(activity.get('Intensity_Level', '')).lower()
-            category = str(activity.get('Activity_Category', '')).lower()
-            
-            adjustment = 1.0
-            
-            # Adjust based on user scores
-            if stress > 5:
-                if 'stress' in benefits:
-                    adjustment *= (1.0 + (stress * 0.05))
-                if 'stress' in category:
-                    adjustment *= (1.0 + (stress * 0.03))
-            
-            if anxiety > 5:
-                if 'anxiety' in benefits:
-                    adjustment *= (1.0 + (anxiety * 0.04))
-                if 'anxiety' in category:
-                    adjustment *= (1.0 + (anxiety * 0.03))
-            
-            if depression > 5:
-                if 'depression' in benefits or 'mood' in benefits:
-                    adjustment *= (1.0 + (depression * 0.05))
-                if 'mood' in category or 'depression' in category:
-                    adjustment *= (1.0 + (depression * 0.03))
-            
-            # Adjust for sleep
-            if sleep < 6 and 'sleep' in benefits:
-                adjustment *= 1.3
-            
-            # Adjust intensity preferences
-            if depression > 6 and 'high' in intensity:
-                adjustment *= 1.2  # High energy for depression
-            if anxiety > 6 and 'low' in intensity:
-                adjustment *= 1.2  # Low intensity for anxiety
-            if stress > 6 and 'low' in intensity or 'medium' in intensity:
-                adjustment *= 1.1
-            
-            # Apply adjustment
-            similarities[i] *= adjustment
+        # Apply score-based adjustments: product of per-flag multipliers = exp(flags @ log-multipliers)
+        similarities *= np.exp(self.adjustment_flags @ self._adjustment_log_weights(stress, anxiety, depression, sleep))
         
         # Get top N activities
-        top_indices = np.argsort(similarities)[::-1][:top_n]
-        
         recommendations = []
-        for idx in top_indices:
-            activity = self.activities.iloc[idx]
+        for idx in top_k(similarities, top_n):
             similarity = float(similarities[idx])
             
             # Calculate match score (65-95%)
@@ -641,7 +1185,7 @@ class ImprovedCosineRecommender:
             match_score = min(95, max(65, match_score))
             
             # Format the activity
-            formatted = self.formatter.format_activity(activity, match_score, method='cosine')
+            formatted = self.card_cache.card_at(idx, match_score, method='cosine')
             formatted['cosine_similarity'] = similarity
             
             recommendations.append(formatted)
@@ -651,6 +1195,38 @@ class ImprovedCosineRecommender:
             print(f"   Top cosine: {recommendations[0]['name']} (similarity: {recommendations[0]['cosine_similarity']:.3f})")
         
         return recommendations
+    
+    def get_recommendations_batch(self, profiles, top_n=5):
+        """Cosine recommendations for many profiles as one (profiles x activities) matrix"""
+        if self.activity_vectors is None or not profiles:
+            return [[] for _ in profiles]
+        
+        values = [
+            (p['Stress_Level'], p['Anxiety_Score'], p['Depression_Score'], p['Sleep_Hours'], p['Steps_Per_Day'])
+            for p in profiles
+        ]
+        
+        from scipy import sparse
+        from sklearn.metrics.pairwise import cosine_similarity
+        
+        user_matrix = sparse.vstack([self._get_user_vector(*v) for v in values])
+        similarities = cosine_similarity(user_matrix, self.activity_vectors)
+        
+        log_weights = np.stack([self._adjustment_log_weights(*v[:4]) for v in values])
+        similarities *= np.exp(log_weights @ self.adjustment_flags.T)
+        
+        results = []
+        for row, top_indices in enumerate(top_k_rows(similarities, top_n)):
+            recommendations = []
+            for idx in top_indices:
+                similarity = float(similarities[row, idx])
+                match_score = min(95, max(65, 65 + (similarity * 30)))
+                formatted = self.card_cache.card_at(idx, match_score, method='cosine')
+                formatted['cosine_similarity'] = similarity
+                recommendations.append(formatted)
+            results.append(recommendations)
+        
+        return results
 
 # ============================================================
 # UPDATED SIMPLE ML RECOMMENDER WITH SCORE-BASED PERSONALIZATION
@@ -659,10 +1235,30 @@ class ImprovedCosineRecommender:
 class SimpleMentalHealthRecommender:
     """Simple ML recommender with correct formatting and score-based personalization"""
     
-    def __init__(self, activities_path, interactions_path):
+    # Keyword flags precomputed per activity: (column, source field, keywords matched with OR)
+    SCORING_FLAGS = [
+        ('b_stress', 'Benefits', ['stress']),
+        ('b_calm_relax', 'Benefits', ['calm', 'relax']),
+        ('c_stress', 'Activity_Category', ['stress']),
+        ('b_anxiety_worry', 'Benefits', ['anxiety', 'worry']),
+        ('b_calm_grounding', 'Benefits', ['calm', 'grounding']),
+        ('c_anxiety', 'Activity_Category', ['anxiety']),
+        ('b_depression_mood', 'Benefits', ['depression', 'mood']),
+        ('b_energy_motivation', 'Benefits', ['energy', 'motivation']),
+        ('c_mood_depression', 'Activity_Category', ['mood', 'depression']),
+        ('c_depression', 'Activity_Category', ['depression']),
+        ('b_sleep_rest', 'Benefits', ['sleep', 'rest']),
+        ('b_relax', 'Benefits', ['relax']),
+        ('t_gentle', 'Activity_Type', ['gentle', 'walking', 'yoga', 'stretch', 'breathing']),
+        ('i_low', 'Intensity_Level', ['low']),
+        ('i_high', 'Intensity_Level', ['high']),
+        ('i_low_medium', 'Intensity_Level', ['low', 'medium']),
+    ]
+    
+    def __init__(self, activities_path, interactions_path, random_seed=None, activities=None):
         print("\n🧠 Initializing Simple ML Recommender...")
         
-        self.activities = safe_read_csv(activities_path)
+        self.activities = activities if activities is not None else safe_read_csv(activities_path)
         
         if self.activities.empty:
             print("   ⚠ Could not read activities CSV, creating sample activities")
@@ -670,13 +1266,92 @@ class SimpleMentalHealthRecommender:
         
         print(f"   ✅ Loaded {len(self.activities)} activities")
         
-        self.interactions = safe_read_csv(interactions_path)
+        # The feedback store holds the CSV rows plus any feedback not yet exported
+        if feedback_store is not None:
+            self.interactions = feedback_store.to_dataframe()
+        else:
+            self.interactions = safe_read_csv(interactions_path)
         if not self.interactions.empty:
             print(f"   ✅ Loaded {len(self.interactions)} interactions")
         
         self.formatter = ActivityFormatter()
+        self.card_cache = ActivityCardCache(self.activities)
+        self.rng = np.random.default_rng(random_seed)
+        self._prepare_scoring_features()
+    
+    def _prepare_scoring_features(self):
+        """Precompute the activity x keyword-flag matrix used for scoring"""
+        self.flag_index = {name: i for i, (name, _, _) in enumerate(self.SCORING_FLAGS)}
+        self.flag_matrix = build_keyword_flags(self.activities, self.SCORING_FLAGS)
+        
+        print(f"   ✅ Precomputed {self.flag_matrix.shape[1]} scoring flags for {len(self.activities)} activities")
+    
+    def _score_weights(self, stress, anxiety, depression, sleep, steps):
+        """Per-flag weights for one user profile (same rules as the original per-row scoring)"""
+        w = np.zeros(len(self.SCORING_FLAGS), dtype=np.float32)
+        f = self.flag_index
+        
+        # 1. Stress-based scoring
+        if stress > 4:
+            w[f['b_stress']] += stress * 4  # Higher stress = more points for stress relief
+            w[f['b_calm_relax']] += stress * 3
+            w[f['c_stress']] += stress * 2
+        
+        # 2. Anxiety-based scoring
+        if anxiety > 4:
+            w[f['b_anxiety_worry']] += anxiety * 4
+            w[f['b_calm_grounding']] += anxiety * 3
+            w[f['c_anxiety']] += anxiety * 2
+        
+        # 3. Depression-based scoring
+        if depression > 4:
+            w[f['b_depression_mood']] += depression * 4
+            w[f['b_energy_motivation']] += depression * 3
+            w[f['c_mood_depression']] += depression * 2
+        
+        # 4. Sleep-based scoring (if poor sleep)
+        if sleep < 6:
+            w[f['b_sleep_rest']] += 25
+            w[f['b_relax']] += 15
+        
+        # 5. Activity level scoring (if low activity)
+        if steps < 3000:
+            w[f['t_gentle']] += 20
+            w[f['i_low']] += 15
+        
+        # 6. Activity category bonus
+        if stress > 5:
+            w[f['c_stress']] += 15
+        if anxiety > 5:
+            w[f['c_anxiety']] += 15
+        # 'depression' in category, or 'mood' in category when depression > 5
+        if depression > 5:
+            w[f['c_mood_depression']] += 15
+        else:
+            w[f['c_depression']] += 15
+        
+        # 7. Intensity adjustment based on scores
+        if depression > 6:
+            w[f['i_high']] += 20  # High energy for depression
+        if anxiety > 6:
+            w[f['i_low']] += 20  # Low intensity for anxiety
+        if stress > 6:
+            w[f['i_low_medium']] += 15
+        
+        return w
     
-    def get_recommendations(self, user_input, top_n=5):
+    def score_activities(self, stress, anxiety, depression, sleep, steps, seed=None):
+        """Raw score for every activity as a NumPy array"""
+        rng = np.random.default_rng(seed) if seed is not None else self.rng
+        
+        weights = self._score_weights(stress, anxiety, depression, sleep, steps)
+        
+        # 8. Base score for all activities, plus randomness to avoid same order every time
+        scores = self.flag_matrix @ weights + 10
+        scores += rng.random(len(scores), dtype=np.float32) * 8
+        return scores
+    
+    def get_recommendations(self, user_input, top_n=5, seed=None):
         """Get recommendations based on user scores"""
         print(f"\n📝 Processing user input for recommendations...")
         
@@ -696,96 +1371,24 @@ class SimpleMentalHealthRecommender:
         print(f"   User scores: Stress={stress}, Anxiety={anxiety}, Depression={depression}")
         
         # Calculate activity scores BASED ON USER SCORES
-        activity_scores = []
-        
-        for idx, row in self.activities.iterrows():
-            score = 0
-            benefits = str(row.get('Benefits', '')).lower()
-            activity_type = str(row.get('Activity_Type', '')).lower()
-            category = str(row.get('Activity_Category', '')).lower()
-            intensity = str(row.get('Intensity_Level', '')).lower()
-            
-            # SCORE BASED ON USER'S SPECIFIC NEEDS
-            
-            # 1. Stress-based scoring
-            if stress > 4:
-                if 'stress' in benefits:
-                    score += stress * 4  # Higher stress = more points for stress relief
-                if 'calm' in benefits or 'relax' in benefits:
-                    score += stress * 3
-                if 'stress' in category:
-                    score += stress * 2
-                    
-            # 2. Anxiety-based scoring  
-            if anxiety > 4:
-                if 'anxiety' in benefits or 'worry' in benefits:
-                    score += anxiety * 4
-                if 'calm' in benefits or 'grounding' in benefits:
-                    score += anxiety * 3
-                if 'anxiety' in category:
-                    score += anxiety * 2
-            
-            # 3. Depression-based scoring
-            if depression > 4:
-                if 'depression' in benefits or 'mood' in benefits:
-                    score += depression * 4
-                if 'energy' in benefits or 'motivation' in benefits:
-                    score += depression * 3
-                if 'mood' in category or 'depression' in category:
-                    score += depression * 2
-            
-            # 4. Sleep-based scoring (if poor sleep)
-            if sleep < 6:
-                if 'sleep' in benefits or 'rest' in benefits:
-                    score += 25
-                if 'relax' in benefits:
-                    score += 15
-            
-            # 5. Activity level scoring (if low activity)
-            if steps < 3000:
-                if any(word in activity_type for word in ['gentle', 'walking', 'yoga', 'stretch', 'breathing']):
-                    score += 20
-                if 'low' in intensity:
-                    score += 15
-            
-            # 6. Activity category bonus
-            if 'stress' in category and stress > 5:
-                score += 15
-            if 'anxiety' in category and anxiety > 5:
-                score += 15
-            if 'depression' in category or 'mood' in category and depression > 5:
-                score += 15
-            
-            # 7. Intensity adjustment based on scores
-            if depression > 6 and 'high' in intensity:
-                score += 20  # High energy for depression
-            if anxiety > 6 and 'low' in intensity:
-                score += 20  # Low intensity for anxiety
-            if stress > 6 and ('low' in intensity or 'medium' in intensity):
-                score += 15
-            
-            # 8. Base score for all activities (ensures some score even without matches)
-            score += 10
-            
-            # Add some randomness to avoid same order every time
-            score += random.uniform(0, 8)
-            
-            activity_scores.append((row, score))
+        activity_scores = self.score_activities(stress, anxiety, depression, sleep, steps, seed=seed)
         
-        # Sort by score (highest first)
-        activity_scores.sort(key=lambda x: x[1], reverse=True)
+        recommendations = []
+        # Top N (highest first) without sorting the whole catalog
+        top_indices = top_k(activity_scores, top_n)
+        if len(top_indices) == 0:
+            return recommendations, scores
         
         # Get max score for normalization
-        max_score = max([s for _, s in activity_scores]) if activity_scores else 1
+        max_score = float(activity_scores.max())
         
-        # Get top N
-        recommendations = []
-        for activity, score in activity_scores[:top_n]:
+        for idx in top_indices:
+            score = float(activity_scores[idx])
             # Convert raw score to match percentage (65-95%)
             match_percentage = 65 + ((score / max_score) * 30)
             match_percentage = min(95, max(65, match_percentage))
             
-            formatted = self.formatter.format_activity(activity, match_percentage, method='simple_ml')
+            formatted = self.card_cache.card_at(idx, match_percentage, method='simple_ml')
             recommendations.append(formatted)
         
         print(f"   ✅ Generated {len(recommendations)} recommendations")
@@ -795,6 +1398,46 @@ class SimpleMentalHealthRecommender:
                 print(f"   {i+1}. {rec['name']} - Score: {rec['match_score']:.1f}%")
         
         return recommendations, scores
+    
+    def get_recommendations_batch(self, profiles, top_n=5, seeds=None):
+        """Recommendations for many profiles: one (profiles x activities) score matrix, row-wise top-k"""
+        if not profiles:
+            return []
+        
+        weights = np.stack([
+            self._score_weights(p['Stress_Level'], p['Anxiety_Score'], p['Depression_Score'],
+                                p['Sleep_Hours'], p['Steps_Per_Day'])
+            for p in profiles
+        ])
+        score_matrix = weights @ self.flag_matrix.T + 10
+        
+        if seeds is None:
+            noise = self.rng.random(score_matrix.shape, dtype=np.float32)
+        else:
+            noise = np.stack([
+                (np.random.default_rng(seed) if seed is not None else self.rng).random(score_matrix.shape[1], dtype=np.float32)
+                for seed in seeds
+            ])
+        score_matrix += noise * 8
+        
+        max_scores = score_matrix.max(axis=1) if score_matrix.shape[1] else np.ones(len(profiles))
+        
+        results = []
+        for row, top_indices in enumerate(top_k_rows(score_matrix, top_n)):
+            recommendations = []
+            for idx in top_indices:
+                match_percentage = 65 + ((float(score_matrix[row, idx]) / float(max_scores[row])) * 30)
+                match_percentage = min(95, max(65, match_percentage))
+                recommendations.append(self.card_cache.card_at(idx, match_percentage, method='simple_ml'))
+            
+            scores = {
+                'Stress_Level': profiles[row]['Stress_Level'],
+                'Anxiety_Score': profiles[row]['Anxiety_Score'],
+                'Depression_Score': profiles[row]['Depression_Score']
+            }
+            results.append((recommendations, scores))
+        
+        return results
 
 # ============================================================
 # HYBRID RECOMMENDER
@@ -803,13 +1446,104 @@ class SimpleMentalHealthRecommender:
 class HybridRecommender:
     """Hybrid recommender combining ML and Cosine methods"""
     
-    def __init__(self, ml_recommender, cosine_recommender):
+    def __init__(self, ml_recommender, cosine_recommender, execution_mode=None, engine_timeout=None,
+                 executor=None, max_concurrency=None):
         self.ml_recommender = ml_recommender
         self.cosine_recommender = cosine_recommender
         self.formatter = ActivityFormatter()
+        self.execution_mode = execution_mode or HYBRID_EXECUTION_MODE
+        self.engine_timeout = engine_timeout if engine_timeout is not None else HYBRID_ENGINE_TIMEOUT
+        
+        if self.execution_mode not in ('parallel', 'sequential'):
+            print(f"   ⚠ Unknown hybrid execution mode '{self.execution_mode}', using sequential")
+            self.execution_mode = 'sequential'
+        
+        # Shared pool for the engine branches (both engines are mostly NumPy/SciPy work that releases the GIL).
+        # Each admitted request holds a slot until both of its tasks finish (even after a timeout), and the
+        # pool has two workers per slot, so admitted tasks start at once and their timeout runs from submission.
+        # A request waits up to engine_timeout for a free slot; if none frees up, it serves the cosine engine
+        # inline (a single vectorized scoring pass) and reports the ML engine as timed out.
+        self.max_concurrency = max(1, max_concurrency or HYBRID_MAX_CONCURRENCY)
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self.executor = executor
+        if self.execution_mode == 'parallel' and self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=2 * self.max_concurrency, thread_name_prefix='hybrid-engine')
+    
+    def with_engines(self, ml_recommender, cosine_recommender):
+        """Copy of this recommender using other engines (shares the pool and its admission slots)"""
+        hybrid = copy.copy(self)
+        hybrid.ml_recommender = ml_recommender
+        hybrid.cosine_recommender = cosine_recommender
+        return hybrid
+    
+    def _run_ml(self, user_input, seed=None):
+        if seed is None:
+            return self.ml_recommender.get_recommendations(user_input, top_n=8)
+        return self.ml_recommender.get_recommendations(user_input, top_n=8, seed=seed)
+    
+    def _run_cosine(self, cosine_profile):
+        return self.cosine_recommender.get_recommendations(cosine_profile, top_n=8)
+    
+    def _run_sequential(self, user_input, cosine_profile, seed=None):
+        results = []
+        for name, fn, args in (('ML', self._run_ml, (user_input, seed)), ('Cosine', self._run_cosine, (cosine_profile,))):
+            try:
+                results.append(fn(*args))
+            except Exception as e:
+                print(f"   ⚠ {name} engine failed: {e}")
+                results.append(None)
+        return results[0], results[1]
+    
+    def _result(self, name, future):
+        """Result of a finished engine task, or None if it failed or is still running (timed out)"""
+        if not future.done():
+            print(f"   ⚠ {name} engine timed out after {self.engine_timeout:.1f}s, continuing without it")
+            future.cancel()
+            return None
+        try:
+            return future.result()
+        except Exception as e:
+            print(f"   ⚠ {name} engine failed: {e}")
+            return None
+    
+    def _run_engines(self, user_input, cosine_profile, seed=None):
+        """Run both engines; returns (ml_result, cosine_result), None for an engine that failed or timed out"""
+        if self.execution_mode == 'sequential':
+            return self._run_sequential(user_input, cosine_profile, seed=seed)
+        
+        if not self._slots.acquire(timeout=self.engine_timeout):
+            print(f"   ⚠ No free engine slot within {self.engine_timeout:.1f}s, using cosine results only")
+            try:
+                return None, self._run_cosine(cosine_profile)
+            except Exception as e:
+                print(f"   ⚠ Cosine engine failed: {e}")
+                return None, None
+        
+        futures = [self.executor.submit(self._run_ml, user_input, seed),
+                   self.executor.submit(self._run_cosine, cosine_profile)]
+        
+        # Release the slot only when both tasks have finished, so abandoned (timed-out) work still counts
+        outstanding = [len(futures)]
+        outstanding_lock = threading.Lock()
+        
+        def task_done(_future):
+            with outstanding_lock:
+                outstanding[0] -= 1
+                if outstanding[0] == 0:
+                    self._slots.release()
+        
+        for future in futures:
+            future.add_done_callback(task_done)
+        
+        wait_futures(futures, timeout=self.engine_timeout)
+        return self._result('ML', futures[0]), self._result('Cosine', futures[1])
     
-    def get_recommendations(self, user_input, top_n=5):
-        """Get hybrid recommendations"""
+    def get_recommendations(self, user_input, top_n=5, seed=None, status=None):
+        """Get hybrid recommendations
+
+        seed makes the ML branch's noise deterministic; if a status dict is passed,
+        status['degraded'] is set when an engine failed or timed out.
+        """
         print(f"\n🧬 Generating hybrid recommendations...")
         
         # Extract scores and ensure they are floats
@@ -822,15 +1556,38 @@ class HybridRecommender:
         print(f"   User scores: Stress={stress}, Anxiety={anxiety}, Depression={depression}")
         
         # Get recommendations from both methods
-        ml_recs, scores = self.ml_recommender.get_recommendations(user_input, top_n=8)
-        cosine_recs = self.cosine_recommender.get_recommendations({
+        ml_result, cosine_result = self._run_engines(user_input, {
             'Stress_Level': stress,
             'Anxiety_Score': anxiety,
             'Depression_Score': depression,
             'Sleep_Hours': sleep,
             'Steps_Per_Day': steps
-        }, top_n=8)
+        }, seed=seed)
+        
+        if status is not None:
+            status['degraded'] = ml_result is None or cosine_result is None
+        
+        if ml_result is not None:
+            ml_recs, scores = ml_result
+        else:
+            ml_recs = []
+            scores = {
+                'Stress_Level': stress,
+                'Anxiety_Score': anxiety,
+                'Depression_Score': depression
+            }
+        cosine_recs = cosine_result or []
+        
+        final_recs = self._fuse(ml_recs, cosine_recs, stress, anxiety, depression, top_n)
         
+        print(f"   ✅ Generated {len(final_recs)} hybrid recommendations")
+        if final_recs:
+            print(f"   Top hybrid: {final_recs[0]['name']} ({final_recs[0]['match_score']:.1f}%)")
+        
+        return final_recs, scores
+    
+    def _fuse(self, ml_recs, cosine_recs, stress, anxiety, depression, top_n):
+        """Combine both engines' cards into the final hybrid ranking"""
         # Combine and deduplicate
         combined = {}
         
@@ -874,11 +1631,128 @@ class HybridRecommender:
         # Take top N
         final_recs = sorted_recs[:top_n]
         
-        print(f"   ✅ Generated {len(final_recs)} hybrid recommendations")
-        if final_recs:
-            print(f"   Top hybrid: {final_recs[0]['name']} ({final_recs[0]['match_score']:.1f}%)")
+        return final_recs
+    
+    def get_recommendations_batch(self, profiles, top_n=5):
+        """Hybrid recommendations for many profiles using both engines' batch paths"""
+        if not profiles:
+            return []
         
-        return final_recs, scores
+        if hasattr(self.ml_recommender, 'get_recommendations_batch'):
+            ml_batch = self.ml_recommender.get_recommendations_batch(profiles, top_n=8)
+        else:
+            ml_batch = [self.ml_recommender.get_recommendations(p, top_n=8) for p in profiles]
+        cosine_batch = self.cosine_recommender.get_recommendations_batch(profiles, top_n=8)
+        
+        results = []
+        for profile, (ml_recs, scores), cosine_recs in zip(profiles, ml_batch, cosine_batch):
+            final_recs = self._fuse(
+                ml_recs, cosine_recs,
+                profile['Stress_Level'], profile['Anxiety_Score'], profile['Depression_Score'],
+                top_n
+            )
+            results.append((final_recs, scores))
+        
+        return results
+
+# ============================================================
+# RESPONSE CACHE - QUANTIZED PROFILES
+# ============================================================
+
+def quantize_profile(profile):
+    """Cache-key form of a (finite) profile; never used for scoring.
+
+    Stress, anxiety and depression scale the scoring weights, so they are kept
+    exact (assessment answers already put them on a 0.25 grid). Sleep and steps
+    only enter through the 'sleep < 6' and 'steps < 3000' rules, which flooring
+    to 0.25h and 100 steps cannot change, so profiles sharing a key score the same.
+    """
+    return {
+        'Stress_Level': profile['Stress_Level'],
+        'Anxiety_Score': profile['Anxiety_Score'],
+        'Depression_Score': profile['Depression_Score'],
+        'Sleep_Hours': math.floor(profile['Sleep_Hours'] * 4) / 4,
+        'Steps_Per_Day': float(math.floor(profile['Steps_Per_Day'] / 100) * 100)
+    }
+
+class ResponseCache:
+    """Thread-safe LRU cache with TTL for recommendation lists.
+
+    Entries are tagged with a generation (catalog/model version). When the
+    generation changes, the whole cache is dropped.
+    """
+    
+    def __init__(self, max_size=4096, ttl=600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+    
+    @staticmethod
+    def seed_for(key):
+        """Deterministic noise seed for a cache key (stable across processes)"""
+        return zlib.crc32(repr(key).encode('utf-8'))
+    
+    def _check_generation(self, generation):
+        if generation != self._generation:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._generation = generation
+    
+    def get(self, key, generation):
+        with self._lock:
+            self._check_generation(generation)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            
+            value, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def put(self, key, value, generation):
+        with self._lock:
+            self._check_generation(generation)
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'enabled': True,
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations
+            }
 
 # ============================================================
 # INITIALIZE RECOMMENDERS
@@ -887,59 +1761,243 @@ class HybridRecommender:
 ml_recommender = None
 cosine_recommender = None
 hybrid_recommender = None
+learning_engine = None
 
-print("\n" + "="*60)
-print("Initializing Recommenders...")
+recommenders_ready = threading.Event()
+startup_error = None
+_warmup_lock = threading.Lock()
+_warmup_thread = None
 
-# Initialize ML recommender
-try:
-    ml_recommender = SimpleMentalHealthRecommender(ACTIVITIES_PATH, INTERACTIONS_PATH)
-    print(f"✅ Simple ML Recommender initialized")
-except Exception as e:
-    print(f"❌ Error initializing ML recommender: {e}")
-    traceback.print_exc()
-    # Create minimal fallback
-    class MinimalRecommender:
-        def __init__(self):
-            self.activities = create_sample_activities()
-            self.formatter = ActivityFormatter()
-        def get_recommendations(self, user_input, top_n=5):
-            scores = {
-                'Stress_Level': float(user_input.get('Stress_Level', 5)),
-                'Anxiety_Score': float(user_input.get('Anxiety_Score', 5)),
-                'Depression_Score': float(user_input.get('Depression_Score', 5))
-            }
-            recs = []
-            activities = self.activities.sample(frac=1).reset_index(drop=True)  # Shuffle
-            for i, (_, row) in enumerate(activities.iterrows()):
-                if i >= top_n:
-                    break
-                match_score = 85.0 - (i * 5) + random.uniform(-3, 3)
-                formatted = self.formatter.format_activity(row, match_score, method='fallback')
-                recs.append(formatted)
-            return recs, scores
-    ml_recommender = MinimalRecommender()
-
-# Initialize cosine recommender
-if ml_recommender and hasattr(ml_recommender, 'activities') and not ml_recommender.activities.empty:
+_catalog_lock = threading.Lock()
+# mtime of the activities CSV the live recommenders were built from
+_catalog_mtime = None
+_catalog_checked_at = 0.0
+
+def _activities_mtime():
+    try:
+        return os.stat(ACTIVITIES_PATH).st_mtime_ns
+    except OSError:
+        return None
+
+def initialize_recommenders():
+    """Build the simple ML, cosine and hybrid recommenders (recording per-phase timings)"""
+    global ml_recommender, cosine_recommender, hybrid_recommender, learning_engine, _catalog_mtime
+    
+    _catalog_mtime = _activities_mtime()
+    print("\n" + "="*60)
+    print("Initializing Recommenders...")
+    init_t0 = time.perf_counter()
+    phase_t0 = init_t0
+
+    # Initialize ML recommender
     try:
-        cosine_recommender = ImprovedCosineRecommender(ml_recommender.activities)
-        print(f"✅ Cosine recommender ready")
+        ml_recommender = SimpleMentalHealthRecommender(ACTIVITIES_PATH, INTERACTIONS_PATH)
+        print(f"✅ Simple ML Recommender initialized")
     except Exception as e:
-        print(f"⚠ Cosine recommender failed: {e}")
+        print(f"❌ Error initializing ML recommender: {e}")
         traceback.print_exc()
-        cosine_recommender = None
-else:
-    print("⚠ No activities for cosine recommender")
+        # Create minimal fallback
+        class MinimalRecommender:
+            def __init__(self):
+                self.activities = create_sample_activities()
+                self.formatter = ActivityFormatter()
+            def get_recommendations(self, user_input, top_n=5, seed=None):
+                scores = {
+                    'Stress_Level': float(user_input.get('Stress_Level', 5)),
+                    'Anxiety_Score': float(user_input.get('Anxiety_Score', 5)),
+                    'Depression_Score': float(user_input.get('Depression_Score', 5))
+                }
+                recs = []
+                rng = random.Random(seed)
+                activities = self.activities.sample(frac=1, random_state=seed).reset_index(drop=True)  # Shuffle
+                for i, (_, row) in enumerate(activities.iterrows()):
+                    if i >= top_n:
+                        break
+                    match_score = 85.0 - (i * 5) + rng.uniform(-3, 3)
+                    formatted = self.formatter.format_activity(row, match_score, method='fallback')
+                    recs.append(formatted)
+                return recs, scores
+        ml_recommender = MinimalRecommender()
+    startup_timings['simple_ml_recommender'] = round(time.perf_counter() - phase_t0, 4)
+    phase_t0 = time.perf_counter()
+
+    # Initialize cosine recommender
+    if ml_recommender and hasattr(ml_recommender, 'activities') and not ml_recommender.activities.empty:
+        try:
+            cosine_recommender = ImprovedCosineRecommender(
+                ml_recommender.activities,
+                card_cache=getattr(ml_recommender, 'card_cache', None)
+            )
+            print(f"✅ Cosine recommender ready")
+        except Exception as e:
+            print(f"⚠ Cosine recommender failed: {e}")
+            traceback.print_exc()
+            cosine_recommender = None
+    else:
+        print("⚠ No activities for cosine recommender")
+    startup_timings['cosine_recommender'] = round(time.perf_counter() - phase_t0, 4)
+    phase_t0 = time.perf_counter()
+
+    # Initialize hybrid recommender
+    if ml_recommender and cosine_recommender:
+        try:
+            hybrid_recommender = HybridRecommender(ml_recommender, cosine_recommender)
+            print(f"✅ Hybrid recommender ready")
+        except Exception as e:
+            print(f"⚠ Hybrid recommender failed: {e}")
+            hybrid_recommender = None
+    startup_timings['hybrid_recommender'] = round(time.perf_counter() - phase_t0, 4)
+    phase_t0 = time.perf_counter()
+    
+    # Optional learning engine (imports scikit-learn models, so only when enabled)
+    if LEARNING_ENGINE_ENABLED:
+        try:
+            from recommendation_engine import MentalHealthRecommender
+            learning_engine = MentalHealthRecommender(ACTIVITIES_PATH, INTERACTIONS_PATH)
+            if learning_engine.load_or_schedule_training():
+                print(f"✅ Learning engine ready (model {learning_engine.model_version})")
+            else:
+                print(f"✅ Learning engine ready (initial model training in background)")
+        except Exception as e:
+            print(f"⚠ Learning engine failed: {e}")
+            traceback.print_exc()
+            learning_engine = None
+        startup_timings['learning_engine'] = round(time.perf_counter() - phase_t0, 4)
+    startup_timings['recommenders_total'] = round(time.perf_counter() - init_t0, 4)
 
-# Initialize hybrid recommender
-if ml_recommender and cosine_recommender:
+def _warm_up():
+    """Build recommenders and mark the service ready (runs once)"""
+    global startup_error
     try:
-        hybrid_recommender = HybridRecommender(ml_recommender, cosine_recommender)
-        print(f"✅ Hybrid recommender ready")
+        initialize_recommenders()
     except Exception as e:
-        print(f"⚠ Hybrid recommender failed: {e}")
-        hybrid_recommender = None
+        startup_error = str(e)
+        print(f"❌ Recommender warm-up failed: {e}")
+        traceback.print_exc()
+    finally:
+        startup_timings['time_to_ready'] = round(time.perf_counter() - _startup_t0, 4)
+        recommenders_ready.set()
+        print(f"✅ Recommenders ready after {startup_timings['time_to_ready']:.2f}s")
+
+def start_warm_up():
+    """Start the warm-up thread if it has not been started yet"""
+    global _warmup_thread
+    with _warmup_lock:
+        if _warmup_thread is None and not recommenders_ready.is_set():
+            _warmup_thread = threading.Thread(target=_warm_up, name='recommender-warmup', daemon=True)
+            _warmup_thread.start()
+
+def ensure_recommenders(timeout=None):
+    """Make sure recommenders are built, waiting up to timeout seconds; returns readiness"""
+    if recommenders_ready.is_set():
+        return True
+    start_warm_up()
+    return recommenders_ready.wait(timeout)
+
+if STARTUP_MODE == 'background':
+    start_warm_up()
+elif STARTUP_MODE == 'lazy':
+    print("\n⏳ Lazy startup: recommenders will be built on first use")
+else:
+    _warm_up()
+
+def reload_catalog():
+    """Re-read the activities CSV and swap in recommenders rebuilt from it (flags, vectors, cards).
+
+    The live recommenders are never mutated: new ones are built off to the side and
+    swapped in, so a request in flight keeps using one consistent catalog.
+    """
+    global ml_recommender, cosine_recommender, hybrid_recommender, _catalog_mtime
+    
+    with _catalog_lock:
+        print("\n🔄 Reloading activity catalog...")
+        mtime = _activities_mtime()
+        activities = safe_read_csv(ACTIVITIES_PATH)
+        if activities.empty:
+            print("   ⚠ Activities CSV is empty or unreadable, keeping current catalog")
+            return False
+        
+        try:
+            new_ml = SimpleMentalHealthRecommender(ACTIVITIES_PATH, INTERACTIONS_PATH, activities=activities)
+            new_cosine = ImprovedCosineRecommender(activities, card_cache=new_ml.card_cache)
+            if hybrid_recommender is not None:
+                new_hybrid = hybrid_recommender.with_engines(new_ml, new_cosine)
+            else:
+                new_hybrid = HybridRecommender(new_ml, new_cosine)
+        except Exception as e:
+            print(f"   ❌ Could not rebuild recommenders, keeping current catalog: {e}")
+            traceback.print_exc()
+            return False
+        
+        ml_recommender, cosine_recommender, hybrid_recommender = new_ml, new_cosine, new_hybrid
+        _catalog_mtime = mtime
+        print(f"   ✅ Catalog reloaded: {len(activities)} activities")
+        return True
+
+def check_catalog_changed():
+    """Reload the catalog if the activities CSV changed (checked at most every CATALOG_CHECK_INTERVAL seconds)"""
+    global _catalog_checked_at
+    
+    now = time.monotonic()
+    if CATALOG_CHECK_INTERVAL <= 0 or now - _catalog_checked_at < CATALOG_CHECK_INTERVAL:
+        return False
+    _catalog_checked_at = now
+    
+    mtime = _activities_mtime()
+    if mtime is None or mtime == _catalog_mtime:
+        return False
+    return reload_catalog()
+
+response_cache = ResponseCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL) if RESPONSE_CACHE_ENABLED else None
+
+def recommender_generation():
+    """Changes whenever the catalog or a fitted model changes (used to invalidate cached responses)"""
+    card_cache = getattr(ml_recommender, 'card_cache', None)
+    return (
+        id(ml_recommender),
+        card_cache.version if card_cache is not None else None,
+        id(getattr(cosine_recommender, 'vectorizer', None))
+    )
+
+def cached_recommendations(method, user_input, top_n=5):
+    """(recommendations, assessment_scores) for 'hybrid', 'ml' or 'cosine', served from the response cache when possible"""
+    profile = extract_profile(user_input)
+    engine = {'hybrid': hybrid_recommender, 'ml': ml_recommender, 'cosine': cosine_recommender}[method]
+    
+    if method == 'cosine':
+        scores = profile
+    else:
+        scores = {
+            'Stress_Level': profile['Stress_Level'],
+            'Anxiety_Score': profile['Anxiety_Score'],
+            'Depression_Score': profile['Depression_Score']
+        }
+    
+    quantized = quantize_profile(profile)
+    key = (method, int(top_n)) + tuple(quantized[col] for col in (
+        'Stress_Level', 'Anxiety_Score', 'Depression_Score', 'Sleep_Hours', 'Steps_Per_Day'))
+    generation = recommender_generation()
+    
+    if response_cache is not None:
+        cached = response_cache.get(key, generation)
+        if cached is not None:
+            return [dict(rec) for rec in cached], scores
+    
+    # Fresh computation on the raw profile with the key's seed, so hits and misses agree
+    seed = ResponseCache.seed_for(key)
+    status = {}
+    if method == 'hybrid':
+        recommendations, _ = engine.get_recommendations(profile, top_n=top_n, seed=seed, status=status)
+    elif method == 'ml':
+        recommendations, _ = engine.get_recommendations(profile, top_n=top_n, seed=seed)
+    else:
+        recommendations = engine.get_recommendations(profile, top_n=top_n)
+    
+    # Don't cache partial answers (an engine timed out) or empty ones
+    if response_cache is not None and recommendations and not status.get('degraded'):
+        response_cache.put(key, tuple(dict(rec) for rec in recommendations), generation)
+    
+    return recommendations, scores
 
 # ============================================================
 # CREATE FLASK APP
@@ -948,6 +2006,24 @@ if ml_recommender and cosine_recommender:
 app = Flask(__name__)
 CORS(app, origins=["*"])
 
+# Endpoints that must answer while recommenders are still warming up
+WARMUP_EXEMPT_PATHS = {'/', '/health', '/ready'}
+
+@app.before_request
+def wait_for_recommenders():
+    """Build (lazy) or wait for (background) the recommenders before serving a request"""
+    if request.path in WARMUP_EXEMPT_PATHS or request.method == 'OPTIONS':
+        return None
+    if not ensure_recommenders(timeout=STARTUP_WAIT_TIMEOUT):
+        return jsonify({'success': False, 'error': 'Recommenders are still starting up, retry shortly'}), 503
+    try:
+        check_catalog_changed()
+    except Exception as e:
+        print(f"⚠ Catalog change check failed: {e}")
+    return None
+
+startup_timings['module_import'] = round(time.perf_counter() - _startup_t0, 4)
+
 # ============================================================
 # ENDPOINTS
 # ============================================================
@@ -967,16 +2043,33 @@ def home():
         'endpoints': {
             '/': 'This info page',
             '/health': 'GET - Health check',
+            '/ready': 'GET - Readiness probe (503 while warming up)',
             '/assess': 'POST - Get hybrid recommendations (default)',
             '/recommend': 'POST - Cosine recommendations',
             '/ml-recommend': 'POST - ML recommendations',
             '/hybrid-recommend': 'POST - Hybrid recommendations',
+            '/batch-recommend': 'POST - Recommendations for an array of assessments',
             '/activity-feedback': 'POST - Submit rating',
             '/activities': 'GET - List activities',
             '/test-format': 'GET - Test activity format'
         }
     })
 
+@app.route('/ready', methods=['GET'])
+def ready():
+    """Readiness probe: 200 once recommenders are built, 503 while warming up"""
+    is_ready = recommenders_ready.is_set() and ml_recommender is not None
+    if not recommenders_ready.is_set():
+        # A probe is a good moment to start a lazy warm-up
+        start_warm_up()
+    
+    return jsonify({
+        'ready': is_ready,
+        'startup_mode': STARTUP_MODE,
+        'startup_timings': dict(startup_timings),
+        'error': startup_error
+    }), 200 if is_ready else 503
+
 @app.route('/health', methods=['GET'])
 def health_check():
     return jsonify({
@@ -986,6 +2079,12 @@ def health_check():
         'cosine_recommender_ready': cosine_recommender is not None,
         'hybrid_recommender_ready': hybrid_recommender is not None,
         'activities_count': len(ml_recommender.activities) if ml_recommender and hasattr(ml_recommender, 'activities') else 0,
+        'user_vector_cache': cosine_recommender.user_vector_cache_stats() if cosine_recommender is not None else None,
+        'hybrid_execution_mode': hybrid_recommender.execution_mode if hybrid_recommender is not None else None,
+        'response_cache': response_cache.stats() if response_cache is not None else {'enabled': False},
+        'ready': recommenders_ready.is_set(),
+        'startup_mode': STARTUP_MODE,
+        'startup_timings': dict(startup_timings),
         'format': 'Correct card format enabled'
     })
 
@@ -1031,7 +2130,7 @@ def hybrid_recommend():
             return jsonify({'success': False, 'error': 'Hybrid recommender not available'}), 500
         
         # Get hybrid recommendations
-        recommendations, scores = hybrid_recommender.get_recommendations(data, top_n=5)
+        recommendations, scores = cached_recommendations('hybrid', data, top_n=5)
         
         # Get next user ID
         next_user_id = get_next_user_id()
@@ -1057,6 +2156,8 @@ def hybrid_recommend():
         
         return jsonify(response)
         
+    except InvalidProfileError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         print(f"❌ Error in /hybrid-recommend: {e}")
         traceback.print_exc()
@@ -1079,7 +2180,7 @@ def ml_recommend():
             return jsonify({'success': False, 'error': 'ML recommender not available'}), 500
         
         # Get ML recommendations
-        recommendations, scores = ml_recommender.get_recommendations(data, top_n=5)
+        recommendations, scores = cached_recommendations('ml', data, top_n=5)
         
         # Get next user ID
         next_user_id = get_next_user_id()
@@ -1105,6 +2206,8 @@ def ml_recommend():
         
         return jsonify(response)
         
+    except InvalidProfileError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         print(f"❌ Error in /ml-recommend: {e}")
         traceback.print_exc()
@@ -1136,7 +2239,7 @@ def cosine_recommend():
         }
         
         # Get recommendations
-        recommendations = cosine_recommender.get_recommendations(user_profile, top_n=5)
+        recommendations, _ = cached_recommendations('cosine', user_profile, top_n=5)
         
         if not recommendations:
             return jsonify({'success': False, 'error': 'No recommendations generated'}), 500
@@ -1152,6 +2255,8 @@ def cosine_recommend():
         
         return jsonify(response)
         
+    except InvalidProfileError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         print(f"❌ Error in /recommend: {e}")
         traceback.print_exc()
@@ -1161,6 +2266,106 @@ def cosine_recommend():
             'details': str(e)
         }), 500
 
+@app.route('/batch-recommend', methods=['POST'])
+def batch_recommend():
+    """Recommendations for many assessments in one call (results in input order)"""
+    try:
+        data = request.json
+        
+        if data is None:
+            return jsonify({'success': False, 'error': 'No data provided'}), 400
+        
+        # Accept either a bare array or {'assessments': [...], 'method': ..., 'top_n': ...}
+        if isinstance(data, list):
+            assessments, options = data, {}
+        elif isinstance(data, dict):
+            assessments, options = data.get('assessments'), data
+        else:
+            assessments, options = None, {}
+        
+        if not isinstance(assessments, list) or not assessments:
+            return jsonify({'success': False, 'error': 'Expected a non-empty array of assessments'}), 400
+        
+        if len(assessments) > BATCH_MAX_ITEMS:
+            return jsonify({'success': False, 'error': f'Batch too large (max {BATCH_MAX_ITEMS} assessments)'}), 400
+        
+        method = str(options.get('method', 'hybrid')).lower()
+        engines = {
+            'hybrid': hybrid_recommender,
+            'ml': ml_recommender,
+            'cosine': cosine_recommender
+        }
+        if method not in engines:
+            return jsonify({'success': False, 'error': f"Unknown method '{method}' (use hybrid, ml or cosine)"}), 400
+        
+        engine = engines[method]
+        if engine is None:
+            return jsonify({'success': False, 'error': f'{method.capitalize()} recommender not available'}), 500
+        
+        try:
+            top_n = max(1, min(50, int(options.get('top_n', 5))))
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'error': 'top_n must be an integer'}), 400
+        
+        print(f"\n📦 Batch request: {len(assessments)} assessments, method={method}, top_n={top_n}")
+        
+        # Validate each item; a bad row only fails itself
+        results = [None] * len(assessments)
+        valid = []
+        for i, item in enumerate(assessments):
+            try:
+                valid.append((i, extract_profile(item)))
+            except (TypeError, ValueError) as e:
+                results[i] = {'index': i, 'success': False, 'error': f'Invalid assessment: {e}'}
+        
+        # Score valid rows chunk by chunk as (profiles x activities) matrices
+        for start in range(0, len(valid), BATCH_CHUNK_SIZE):
+            chunk = valid[start:start + BATCH_CHUNK_SIZE]
+            profiles = [profile for _, profile in chunk]
+            
+            try:
+                if method == 'cosine':
+                    batch = [(recs, profile) for recs, profile in zip(engine.get_recommendations_batch(profiles, top_n), profiles)]
+                elif hasattr(engine, 'get_recommendations_batch'):
+                    batch = engine.get_recommendations_batch(profiles, top_n)
+                else:
+                    batch = [engine.get_recommendations(profile, top_n=top_n) for profile in profiles]
+            except Exception as e:
+                print(f"❌ Batch chunk failed: {e}")
+                traceback.print_exc()
+                for i, _ in chunk:
+                    results[i] = {'index': i, 'success': False, 'error': f'Scoring failed: {e}'}
+                continue
+            
+            for (i, _), (recommendations, scores) in zip(chunk, batch):
+                results[i] = {
+                    'index': i,
+                    'success': True,
+                    'assessment_scores': scores,
+                    'recommendations': recommendations,
+                    'recommendations_count': len(recommendations)
+                }
+        
+        failed = sum(1 for r in results if not r['success'])
+        print(f"   ✅ Batch done: {len(results) - failed} succeeded, {failed} failed")
+        
+        return jsonify({
+            'success': True,
+            'method': method,
+            'count': len(results),
+            'failed_count': failed,
+            'results': results
+        })
+        
+    except Exception as e:
+        print(f"❌ Error in /batch-recommend: {e}")
+        traceback.print_exc()
+        return jsonify({
+            'success': False,
+            'error': 'Internal server error',
+            'details': str(e)
+        }), 500
+
 @app.route('/activity-feedback', methods=['POST'])
 def submit_activity_feedback():
     """Submit activity rating"""
@@ -1198,6 +2403,20 @@ def submit_activity_feedback():
             activity_rating=rating
         )
         
+        if success and learning_engine is not None:
+            # Records the rating for the engine and schedules a debounced background retrain
+            try:
+                learning_engine.save_user_rating(user_id, activity_id, rating, user_profile={
+                    'Stress_Level': float(stress),
+                    'Anxiety_Score': float(anxiety),
+                    'Depression_Score': float(depression),
+                    'Sleep_Hours': float(sleep),
+                    'Steps_Per_Day': float(steps),
+                    'Mood_Description': str(mood)
+                })
+            except Exception as e:
+                print(f"⚠ Learning engine could not record rating: {e}")
+        
         if success:
             return jsonify({
                 'success': True,
@@ -1217,6 +2436,42 @@ def submit_activity_feedback():
             'details': str(e)
         }), 500
 
+@app.route('/retraining-status', methods=['GET'])
+def retraining_status():
+    """Background retraining status of the learning engine"""
+    if learning_engine is None:
+        return jsonify({
+            'success': False,
+            'enabled': LEARNING_ENGINE_ENABLED,
+            'error': 'Learning engine not running (set LEARNING_ENGINE_ENABLED=1)'
+        }), 404
+    
+    try:
+        return jsonify({'success': True, 'enabled': True, **learning_engine.get_retraining_status()})
+    except Exception as e:
+        print(f"❌ Error in /retraining-status: {e}")
+        traceback.print_exc()
+        return jsonify({'success': False, 'error': 'Internal server error'}), 500
+
+@app.route('/reload-catalog', methods=['POST'])
+def reload_catalog_endpoint():
+    """Reload the activities catalog (requires X-Admin-Token to match ADMIN_TOKEN)"""
+    if not ADMIN_TOKEN:
+        return jsonify({'success': False, 'error': 'Catalog reload endpoint is disabled (ADMIN_TOKEN not set)'}), 403
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), ADMIN_TOKEN):
+        return jsonify({'success': False, 'error': 'Invalid admin token'}), 403
+    
+    try:
+        reloaded = reload_catalog()
+        return jsonify({
+            'success': reloaded,
+            'activities_count': len(ml_recommender.activities) if reloaded else None
+        }), (200 if reloaded else 500)
+    except Exception as e:
+        print(f"❌ Error in /reload-catalog: {e}")
+        traceback.print_exc()
+        return jsonify({'success': False, 'error': 'Internal server error'}), 500
+
 @app.route('/activities', methods=['GET'])
 def get_activities():
     """Get list of activities"""
@@ -1282,6 +2537,7 @@ if __name__ == '__main__':
     print("   • Match percentage separate from description")
     print("="*60)
     print("✅ RECOMMENDATION METHODS:")
+    print(f"   • Startup mode: {STARTUP_MODE}" + ("" if recommenders_ready.is_set() else " (recommenders warming up)"))
     print(f"   • ML Recommender: {'✓ READY' if ml_recommender else '✗ UNAVAILABLE'}")
     print(f"   • Cosine Recommender: {'✓ READY' if cosine_recommender else '✗ UNAVAILABLE'}")
     print(f"   • Hybrid Recommender: {'✓ READY' if hybrid_recommender else '✗ UNAVAILABLE'}")
@@ -0,0 +1,248 @@
+import os
+import sys
+import json
+import shutil
+import hashlib
+import numpy as np
+import pandas as pd
+
+# Columnar binary snapshots of the data CSVs, so startup skips CSV parsing.
+# One directory per CSV and reader under <csv dir>/snapshots/<name>/<key>/,
+# where <key> hashes the reader's parse options (encodings tried, on_bad_lines,
+# ...) so readers that parse the same file differently never share a snapshot.
+# Each holds manifest.json plus one .npy per numeric column (memory-mapped on
+# load, not copied); text and categorical columns are int32 codes plus a UTF-8
+# table of their distinct strings. A snapshot is used only while the CSV's
+# size/mtime (or, if those changed, its sha256) match the manifest.
+
+SNAPSHOT_FORMAT = 2
+DEFAULT_READ_OPTIONS = {'encodings': ['utf-8', 'latin-1', 'cp1252', 'iso-8859-1']}
+# How recommendation_engine parses the data CSVs (malformed rows dropped)
+ENGINE_READ_OPTIONS = dict(DEFAULT_READ_OPTIONS, on_bad_lines='skip')
+SNAPSHOTS_ENABLED = os.environ.get('CSV_SNAPSHOTS', '1').lower() not in ('0', 'false', 'no')
+
+
+def _options_key(read_options):
+    encoded = json.dumps(read_options or {}, sort_keys=True).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+
+def snapshot_dir(csv_path, read_options=None):
+    """Snapshot directory for a CSV file parsed with read_options"""
+    base = os.path.dirname(os.path.abspath(csv_path))
+    name = os.path.splitext(os.path.basename(csv_path))[0]
+    return os.path.join(base, 'snapshots', name, _options_key(read_options))
+
+
+def _write_manifest(directory, manifest):
+    """Write manifest.json via a temp file, so readers never see a partial one"""
+    tmp_path = os.path.join(directory, f'manifest.json.tmp-{os.getpid()}')
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, os.path.join(directory, 'manifest.json'))
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _source_stat(csv_path):
+    stat = os.stat(csv_path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _write_strings(directory, prefix, strings):
+    """Store a list of strings as one UTF-8 blob plus character end offsets"""
+    text = ''.join(strings)
+    offsets = np.cumsum([len(item) for item in strings], dtype=np.int64)
+    np.save(os.path.join(directory, f'{prefix}.blob.npy'), np.frombuffer(text.encode('utf-8'), dtype=np.uint8))
+    np.save(os.path.join(directory, f'{prefix}.offsets.npy'), offsets)
+
+
+def _read_strings(directory, prefix):
+    text = np.load(os.path.join(directory, f'{prefix}.blob.npy'), mmap_mode='r').tobytes().decode('utf-8')
+    offsets = np.load(os.path.join(directory, f'{prefix}.offsets.npy')).tolist()
+    strings = np.empty(len(offsets), dtype=object)
+    start = 0
+    for j, end in enumerate(offsets):
+        strings[j] = text[start:end]
+        start = end
+    return strings
+
+
+def _write_text(directory, i, values):
+    """Dictionary-encode a text column: int32 codes (-1 = missing) + table of unique strings"""
+    codes, uniques = pd.factorize(values, use_na_sentinel=True)
+    np.save(os.path.join(directory, f'{i}.npy'), codes.astype(np.int32))
+    _write_strings(directory, i, [str(value) for value in uniques])
+
+
+def _read_text(directory, i):
+    codes = np.load(os.path.join(directory, f'{i}.npy'), mmap_mode='r')
+    table = np.append(_read_strings(directory, i), np.nan)  # code -1 picks the trailing NaN
+    return table[codes]
+
+
+def _is_text(series):
+    values = series.dropna()
+    return all(isinstance(value, str) for value in values)
+
+
+def save_snapshot(df, csv_path, read_options=None):
+    """Write a snapshot of df, parsed from csv_path with read_options (atomic directory swap); True on success"""
+    if not SNAPSHOTS_ENABLED or df is None or df.empty or not os.path.exists(csv_path):
+        return False
+
+    final_dir = snapshot_dir(csv_path, read_options)
+    tmp_dir = f"{final_dir}.tmp-{os.getpid()}"
+
+    try:
+        source = _source_stat(csv_path)
+        source['sha256'] = _file_sha256(csv_path)
+
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        read_options = json.loads(json.dumps(read_options or {}))
+
+        columns = []
+        for i, name in enumerate(df.columns):
+            series = df[name]
+            if isinstance(series.dtype, pd.CategoricalDtype) and _is_text(pd.Series(series.cat.categories)):
+                np.save(os.path.join(tmp_dir, f'{i}.npy'), series.cat.codes.to_numpy())
+                _write_strings(tmp_dir, i, [str(value) for value in series.cat.categories])
+                columns.append({'name': name, 'kind': 'category'})
+            elif pd.api.types.is_numeric_dtype(series.dtype) and isinstance(series.dtype, np.dtype):
+                np.save(os.path.join(tmp_dir, f'{i}.npy'), series.to_numpy())
+                columns.append({'name': name, 'kind': 'numeric'})
+            elif _is_text(series):
+                _write_text(tmp_dir, i, series.to_numpy(dtype=object))
+                columns.append({'name': name, 'kind': 'text'})
+            else:
+                print(f"   ⚠️ Snapshot skipped: column {name!r} ({series.dtype}) is not supported")
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                return False
+
+        manifest = {'format': SNAPSHOT_FORMAT, 'source': source, 'read_options': read_options,
+                    'rows': len(df), 'columns': columns}
+        _write_manifest(tmp_dir, manifest)
+
+        old_dir = f"{final_dir}.old-{os.getpid()}"
+        if os.path.exists(final_dir):
+            os.replace(final_dir, old_dir)
+        os.replace(tmp_dir, final_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+        print(f"   💾 Snapshot written: {os.path.relpath(final_dir)}")
+        return True
+
+    except Exception as e:
+        print(f"   ⚠️ Could not write snapshot for {os.path.basename(csv_path)}: {e}")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        return False
+
+
+def _fresh_manifest(csv_path, read_options=None):
+    """Manifest of the snapshot if it matches the current CSV and read_options, else None"""
+    directory = snapshot_dir(csv_path, read_options)
+    manifest_path = os.path.join(directory, 'manifest.json')
+    if not os.path.exists(manifest_path) or not os.path.exists(csv_path):
+        return None
+
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    if manifest.get('format') != SNAPSHOT_FORMAT:
+        return None
+    if manifest.get('read_options') != json.loads(json.dumps(read_options or {})):
+        return None
+
+    source = manifest['source']
+    current = _source_stat(csv_path)
+    if current['size'] == source['size'] and current['mtime_ns'] == source['mtime_ns']:
+        return manifest
+
+    # Touched but possibly unchanged (e.g. fresh checkout): fall back to the content hash
+    if current['size'] == source['size'] and _file_sha256(csv_path) == source['sha256']:
+        source['mtime_ns'] = current['mtime_ns']
+        try:
+            _write_manifest(directory, manifest)
+        except OSError:
+            pass
+        return manifest
+
+    return None
+
+
+def load_snapshot(csv_path, usecols=None, read_options=None):
+    """DataFrame from a fresh snapshot of csv_path parsed with read_options, or None (stale, missing or unreadable)"""
+    if not SNAPSHOTS_ENABLED:
+        return None
+
+    try:
+        manifest = _fresh_manifest(csv_path, read_options)
+        if manifest is None:
+            return None
+
+        directory = snapshot_dir(csv_path, read_options)
+        data = {}
+        for i, column in enumerate(manifest['columns']):
+            name = column['name']
+            if usecols is not None and not (usecols(name) if callable(usecols) else name in usecols):
+                continue
+
+            if column['kind'] == 'numeric':
+                data[name] = np.load(os.path.join(directory, f'{i}.npy'), mmap_mode='r')
+            elif column['kind'] == 'category':
+                codes = np.load(os.path.join(directory, f'{i}.npy'))
+                categories = _read_strings(directory, i)
+                data[name] = pd.Categorical.from_codes(codes, categories=categories)
+            else:
+                data[name] = _read_text(directory, i)
+
+        # copy=False keeps numeric columns on the read-only memory maps instead of copying them
+        df = pd.DataFrame(data, columns=list(data), copy=False)
+        if len(df) != manifest['rows']:
+            return None
+
+        print(f"   ⚡ Loaded {os.path.basename(csv_path)} from snapshot: {len(df)} rows")
+        return df
+
+    except Exception as e:
+        print(f"   ⚠️ Snapshot unreadable for {os.path.basename(csv_path)}, using CSV: {e}")
+        return None
+
+
+def build_snapshot(csv_path, read_options=None):
+    """Parse csv_path the way read_options describe and (re)write its snapshot"""
+    read_options = read_options or DEFAULT_READ_OPTIONS
+    kwargs = {key: value for key, value in read_options.items() if key != 'encodings'}
+    print(f"\n📂 Snapshotting {os.path.basename(csv_path)}...")
+    for encoding in read_options.get('encodings', DEFAULT_READ_OPTIONS['encodings']):
+        try:
+            df = pd.read_csv(csv_path, encoding=encoding, **kwargs)
+            if not df.empty:
+                break
+        except Exception:
+            continue
+    else:
+        print(f"   ❌ Could not parse {csv_path}")
+        return False
+    return save_snapshot(df, csv_path, read_options)
+
+
+if __name__ == '__main__':
+    data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+    paths = sys.argv[1:] or [
+        os.path.join(data_dir, 'activities_steps_improved.csv'),
+        os.path.join(data_dir, 'user_dataset_interlinked.csv'),
+    ]
+    # Snapshots the recommendation engine's reads; app.py snapshots its own on first read
+    ok = all([build_snapshot(path, ENGINE_READ_OPTIONS) for path in paths])
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,22 @@
+import numpy as np
+
+# Top-k selection shared by the app's recommenders and the ML engine:
+# argpartition picks the k best in O(n), then only those k are sorted.
+
+
+def top_k_rows(score_matrix, k):
+    """Column indices of the k highest scores in each row, best first"""
+    n_rows, n_cols = score_matrix.shape
+    k = min(max(0, int(k)), n_cols)
+    if k == 0:
+        return np.empty((n_rows, 0), dtype=int)
+    
+    top = np.argpartition(-score_matrix, k - 1, axis=1)[:, :k]
+    top_scores = np.take_along_axis(score_matrix, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind='stable')
+    return np.take_along_axis(top, order, axis=1)
+
+
+def top_k(scores, k):
+    """Indices of the k highest scores in a 1-D array, best first"""
+    return top_k_rows(np.asarray(scores)[None, :], k)[0]
@@ -6,15 +6,724 @@ import pickle
 import traceback
 import numpy as np
 import json
+from types import MappingProxyType
+import hashlib
+import shutil
+import joblib
+import copy
+from collections import namedtuple
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-from sklearn.cluster import KMeans
+from sklearn.cluster import KMeans, MiniBatchKMeans
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import mean_squared_error
+from csv_snapshot import ENGINE_READ_OPTIONS, SNAPSHOTS_ENABLED, load_snapshot, save_snapshot
+from ranking import top_k
+
+class RatingsDatabase:
+    """Connection manager for the ratings SQLite database.
+    
+    One writer connection serialized by a lock plus a small pool of reusable
+    read-only connections, all in WAL mode so readers never block the writer
+    (or each other) while a retrain is scanning the table. SQL strings are kept
+    constant so sqlite3's per-connection statement cache reuses prepared statements.
+    """
+    
+    PRAGMAS = (
+        'PRAGMA journal_mode=WAL',
+        'PRAGMA synchronous=NORMAL',
+        'PRAGMA cache_size=-8192',
+        'PRAGMA temp_store=MEMORY',
+        'PRAGMA busy_timeout=30000',
+    )
+    
+    def __init__(self, db_path, max_idle_readers=8):
+        self.db_path = db_path
+        self.max_idle_readers = max_idle_readers
+        self._write_lock = threading.Lock()
+        self._writer_conn = None
+        self._pool_lock = threading.Lock()
+        self._idle_readers = []
+    
+    def _open(self, read_only):
+        """Open a tuned connection (autocommit; transactions are explicit)"""
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None,
+                               check_same_thread=False, cached_statements=128)
+        for pragma in self.PRAGMAS:
+            conn.execute(pragma)
+        if read_only:
+            conn.execute('PRAGMA query_only=ON')
+        return conn
+    
+    @contextmanager
+    def reader(self):
+        """Borrow a read connection from the pool"""
+        with self._pool_lock:
+            conn = self._idle_readers.pop() if self._idle_readers else None
+        if conn is None:
+            conn = self._open(read_only=True)
+        try:
+            yield conn
+        finally:
+            with self._pool_lock:
+                if len(self._idle_readers) < self.max_idle_readers:
+                    self._idle_readers.append(conn)
+                    conn = None
+            if conn is not None:
+                conn.close()
+    
+    @contextmanager
+    def writer(self):
+        """Run a write transaction on the shared writer connection"""
+        with self._write_lock:
+            if self._writer_conn is None:
+                self._writer_conn = self._open(read_only=False)
+            conn = self._writer_conn
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+    
+    def close(self):
+        """Close the writer and all idle readers"""
+        with self._write_lock:
+            if self._writer_conn is not None:
+                self._writer_conn.close()
+                self._writer_conn = None
+        with self._pool_lock:
+            for conn in self._idle_readers:
+                conn.close()
+            self._idle_readers = []
+
+
+class RetrainWorker:
+    """Debounced, single-flight background runner for model retraining.
+    
+    request() only records the request and wakes the worker thread, so callers
+    return immediately. The worker waits until no new request has arrived for
+    debounce_seconds, then runs retrain_fn; requests arriving during a run are
+    coalesced into at most one follow-up run.
+    """
+    
+    def __init__(self, retrain_fn, debounce_seconds=30.0):
+        self.retrain_fn = retrain_fn
+        self.debounce_seconds = debounce_seconds
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._pending = False
+        self._running = False
+        self._last_request = 0.0
+        self._stats = {
+            'requests': 0,
+            'runs': 0,
+            'last_started': None,
+            'last_finished': None,
+            'last_duration_seconds': None,
+            'last_result': None,
+            'last_error': None,
+        }
+    
+    def request(self, immediate=False):
+        """Ask for a retrain check (returns immediately); immediate skips the debounce wait"""
+        with self._lock:
+            self._stats['requests'] += 1
+            self._pending = True
+            self._last_request = time.monotonic() - (self.debounce_seconds if immediate else 0)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name='retrain-worker', daemon=True)
+                self._thread.start()
+        self._wake.set()
+    
+    def _loop(self):
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._thread = None
+                    return
+                wait = self._last_request + self.debounce_seconds - time.monotonic()
+                if wait <= 0:
+                    self._pending = False
+                    self._running = True
+                    self._stats['last_started'] = datetime.now().isoformat()
+            
+            if wait > 0:
+                # Debounce: sleep until the quiet period ends (or a new request resets it)
+                self._wake.wait(wait)
+                self._wake.clear()
+                continue
+            
+            started = time.perf_counter()
+            result, error = None, None
+            try:
+                result = bool(self.retrain_fn())
+            except Exception as e:
+                error = str(e)
+                print(f"⚠️ Background retraining failed: {e}")
+                traceback.print_exc()
+            
+            with self._lock:
+                self._running = False
+                self._stats['runs'] += 1
+                self._stats['last_finished'] = datetime.now().isoformat()
+                self._stats['last_duration_seconds'] = round(time.perf_counter() - started, 3)
+                self._stats['last_result'] = result
+                self._stats['last_error'] = error
+    
+    def status(self):
+        """JSON-serializable worker status"""
+        with self._lock:
+            state = 'running' if self._running else ('pending' if self._pending else 'idle')
+            return dict(self._stats, state=state, debounce_seconds=self.debounce_seconds)
+
+
+class ModelArtifactStore:
+    """Versioned, content-hashed model artifacts with atomic publish.
+    
+    Each version is a directory holding one uncompressed joblib bundle (kmeans,
+    forest, both scalers) and a manifest.json with the bundle's sha256 and the
+    training state. A version is written to a temp directory, fsynced, renamed
+    into place in one step, and only then made current by atomically replacing
+    the CURRENT pointer file, so readers never see a half-written set. Bundles
+    load with mmap_mode='r': plain NumPy arrays (the compiled forest, the rating
+    table, scaler statistics) are mapped from the page cache and shared between
+    worker processes. sklearn tree node arrays are rebuilt by the Cython trees'
+    __setstate__, so each process still holds its own copy of the forest.
+    
+    The sha256 is computed once at publish time. load() checks the manifest and
+    the file size on the hot path; pass verify_hash=True (or call verify()) to
+    re-hash the bundle, e.g. before rolling back to an old version.
+    """
+    
+    BUNDLE_FILE = 'models.joblib'
+    MANIFEST_FILE = 'manifest.json'
+    POINTER_FILE = 'CURRENT'
+    FORMAT_VERSION = 1
+    
+    def __init__(self, root, keep_versions=5):
+        self.root = root
+        self.keep_versions = keep_versions
+        os.makedirs(root, exist_ok=True)
+    
+    @staticmethod
+    def _sha256(filepath):
+        digest = hashlib.sha256()
+        with open(filepath, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        return digest.hexdigest()
+    
+    @staticmethod
+    def _fsync(filepath):
+        fd = os.open(filepath, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    
+    def _replace_pointer(self, version):
+        """Atomically point CURRENT at a version"""
+        tmp_path = os.path.join(self.root, f'.{self.POINTER_FILE}.{os.getpid()}.tmp')
+        with open(tmp_path, 'w') as f:
+            f.write(version)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, os.path.join(self.root, self.POINTER_FILE))
+    
+    def publish(self, bundle, metadata=None):
+        """Write bundle as a new version and make it current; returns the version id"""
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+        tmp_dir = os.path.join(self.root, f'.tmp-{stamp}-{os.getpid()}')
+        os.makedirs(tmp_dir)
+        try:
+            bundle_path = os.path.join(tmp_dir, self.BUNDLE_FILE)
+            joblib.dump(bundle, bundle_path)  # uncompressed, so arrays can be memory-mapped on load
+            self._fsync(bundle_path)
+            
+            content_hash = self._sha256(bundle_path)
+            version = f'{stamp}-{content_hash[:12]}'
+            manifest = {
+                'format': self.FORMAT_VERSION,
+                'version': version,
+                'created': datetime.now().isoformat(),
+                'components': sorted(bundle.keys()),
+                'files': {
+                    self.BUNDLE_FILE: {'sha256': content_hash, 'bytes': os.path.getsize(bundle_path)}
+                },
+                'metadata': metadata or {}
+            }
+            manifest_path = os.path.join(tmp_dir, self.MANIFEST_FILE)
+            with open(manifest_path, 'w') as f:
+                json.dump(manifest, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            
+            os.rename(tmp_dir, os.path.join(self.root, version))
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        
+        self._replace_pointer(version)
+        self.prune()
+        return version
+    
+    def current_version(self):
+        """Version id CURRENT points at (None if nothing published yet)"""
+        pointer = os.path.join(self.root, self.POINTER_FILE)
+        if not os.path.exists(pointer):
+            return None
+        with open(pointer) as f:
+            return f.read().strip() or None
+    
+    def list_versions(self):
+        """Published version ids, oldest first"""
+        return sorted(
+            name for name in os.listdir(self.root)
+            if not name.startswith('.') and os.path.isfile(os.path.join(self.root, name, self.MANIFEST_FILE))
+        )
+    
+    def set_current(self, version):
+        """Make an already-published version current (e.g. to roll back)"""
+        if version not in self.list_versions():
+            raise ValueError(f"Unknown model version: {version}")
+        self._replace_pointer(version)
+    
+    def _read_manifest(self, version):
+        with open(os.path.join(self.root, version, self.MANIFEST_FILE)) as f:
+            return json.load(f)
+    
+    def verify(self, version):
+        """Re-hash a version's bundle against its manifest (raises ValueError on mismatch)"""
+        manifest = self._read_manifest(version)
+        bundle_path = os.path.join(self.root, version, self.BUNDLE_FILE)
+        if self._sha256(bundle_path) != manifest['files'][self.BUNDLE_FILE]['sha256']:
+            raise ValueError(f"Model artifact {version} failed its content hash check")
+        return manifest
+    
+    def load(self, version=None, mmap=True, verify_hash=False):
+        """(bundle, manifest) for a version (default: current).
+        
+        Checks the manifest format and the bundle's size; the full content hash
+        is only recomputed with verify_hash=True.
+        """
+        version = version or self.current_version()
+        if version is None:
+            return None, None
+        
+        manifest = self.verify(version) if verify_hash else self._read_manifest(version)
+        if manifest.get('format') != self.FORMAT_VERSION:
+            raise ValueError(f"Model artifact {version} has unsupported format {manifest.get('format')}")
+        
+        bundle_path = os.path.join(self.root, version, self.BUNDLE_FILE)
+        expected_bytes = manifest['files'][self.BUNDLE_FILE]['bytes']
+        if os.path.getsize(bundle_path) != expected_bytes:
+            raise ValueError(f"Model artifact {version} is {os.path.getsize(bundle_path)} bytes, "
+                             f"manifest says {expected_bytes}")
+        
+        bundle = joblib.load(bundle_path, mmap_mode='r' if mmap else None)
+        return bundle, manifest
+    
+    def prune(self):
+        """Delete the oldest versions beyond keep_versions (never the current one)"""
+        current = self.current_version()
+        versions = self.list_versions()
+        for version in versions[:max(0, len(versions) - self.keep_versions)]:
+            if version != current:
+                shutil.rmtree(os.path.join(self.root, version), ignore_errors=True)
+
+
+class CompiledForest:
+    """RandomForestRegressor flattened into contiguous NumPy node arrays.
+    
+    The ML scaler's mean/scale and the KMeans centroid assignment (with its
+    scaler) are compiled into the same object, so a request needs no sklearn
+    calls: one vectorized standardization, one lock-step descent of every tree
+    for every row, and a mean over trees. Inputs are standardized in float64 and
+    cast to float32 before comparing with the split thresholds, exactly as
+    sklearn's trees do, so split decisions match sklearn; only the summation
+    order over trees differs (float tolerance). Leaves point to themselves, so
+    the descent runs a fixed max_depth steps without branching.
+    """
+    
+    def __init__(self, feature, threshold, left, right, value, roots, max_depth,
+                 ml_mean, ml_scale, cluster_mean=None, cluster_scale=None, cluster_centers=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.max_depth = max_depth
+        self.ml_mean = ml_mean
+        self.ml_scale = ml_scale
+        self.cluster_mean = cluster_mean
+        self.cluster_scale = cluster_scale
+        self.cluster_centers = cluster_centers
+    
+    @property
+    def n_features(self):
+        return len(self.ml_mean)
+    
+    @property
+    def n_trees(self):
+        return len(self.roots)
+    
+    @staticmethod
+    def _scaler_arrays(scaler, n_features):
+        mean = getattr(scaler, 'mean_', None)
+        scale = getattr(scaler, 'scale_', None)
+        mean = np.zeros(n_features) if mean is None else np.asarray(mean, dtype=np.float64)
+        scale = np.ones(n_features) if scale is None else np.asarray(scale, dtype=np.float64)
+        return np.ascontiguousarray(mean), np.ascontiguousarray(scale)
+    
+    @classmethod
+    def compile(cls, ml_model, scaler_ml, kmeans_model=None, scaler_cluster=None):
+        """Compile a fitted forest (+ scalers and KMeans); None if the model isn't a fitted forest"""
+        estimators = getattr(ml_model, 'estimators_', None)
+        n_features = getattr(ml_model, 'n_features_in_', None)
+        if not estimators or n_features is None or not hasattr(scaler_ml, 'scale_'):
+            return None
+        
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        max_depth, offset = 0, 0
+        for estimator in estimators:
+            tree = estimator.tree_
+            is_leaf = tree.children_left < 0
+            node_ids = np.arange(tree.node_count, dtype=np.int64) + offset
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(np.where(is_leaf, 0.0, tree.threshold))
+            lefts.append(np.where(is_leaf, node_ids, tree.children_left + offset))
+            rights.append(np.where(is_leaf, node_ids, tree.children_right + offset))
+            values.append(tree.value.reshape(tree.node_count, -1)[:, 0])
+            roots.append(offset)
+            max_depth = max(max_depth, int(tree.max_depth))
+            offset += tree.node_count
+        
+        index_dtype = np.int32 if offset < np.iinfo(np.int32).max else np.int64
+        ml_mean, ml_scale = cls._scaler_arrays(scaler_ml, n_features)
+        
+        cluster_mean = cluster_scale = cluster_centers = None
+        if kmeans_model is not None and hasattr(kmeans_model, 'cluster_centers_') and hasattr(scaler_cluster, 'mean_'):
+            cluster_centers = np.ascontiguousarray(kmeans_model.cluster_centers_, dtype=np.float64)
+            cluster_mean, cluster_scale = cls._scaler_arrays(scaler_cluster, cluster_centers.shape[1])
+        
+        return cls(
+            feature=np.concatenate(features).astype(index_dtype),
+            threshold=np.concatenate(thresholds).astype(np.float64),
+            left=np.concatenate(lefts).astype(index_dtype),
+            right=np.concatenate(rights).astype(index_dtype),
+            value=np.concatenate(values).astype(np.float64),
+            roots=np.asarray(roots, dtype=index_dtype),
+            max_depth=max_depth,
+            ml_mean=ml_mean,
+            ml_scale=ml_scale,
+            cluster_mean=cluster_mean,
+            cluster_scale=cluster_scale,
+            cluster_centers=cluster_centers
+        )
+    
+    def assign_cluster(self, profile):
+        """Nearest KMeans centroid for one raw profile (None if no clustering was compiled)"""
+        if self.cluster_centers is None:
+            return None
+        return int(self.assign_clusters(np.asarray(profile, dtype=np.float64).reshape(1, -1))[0])
+    
+    def assign_clusters(self, profiles):
+        """Nearest KMeans centroid for each row of raw profiles"""
+        scaled = (np.asarray(profiles, dtype=np.float64) - self.cluster_mean) / self.cluster_scale
+        distances = ((scaled[:, None, :] - self.cluster_centers[None, :, :]) ** 2).sum(axis=2)
+        return np.argmin(distances, axis=1)
+    
+    def predict(self, X):
+        """Forest predictions for raw (unscaled) feature rows"""
+        X_scaled = ((np.asarray(X, dtype=np.float64) - self.ml_mean) / self.ml_scale).astype(np.float32)
+        rows = np.arange(len(X_scaled))[:, None]
+        nodes = np.repeat(self.roots[None, :], len(X_scaled), axis=0)
+        for _ in range(self.max_depth):
+            go_left = X_scaled[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return self.value[nodes].mean(axis=1)
+
+
+class RatingTable:
+    """ML ratings precomputed on a quantized profile grid.
+    
+    table[stress, anxiety, depression, sleep, steps, activity] holds the model's
+    rating (float16) at each grid point, with the cluster feature assigned per
+    grid point as at serving time. Lookup is either the nearest grid point or
+    multilinear interpolation over the 2^5 surrounding points. activity_ids
+    records the catalog order the table was built for.
+    """
+    
+    AXES = ('stress', 'anxiety', 'depression', 'sleep', 'steps')
+    
+    def __init__(self, axes, table, activity_ids, report=None):
+        self.axes = axes
+        self.table = table
+        self.activity_ids = activity_ids
+        self.report = report or {}
+    
+    @property
+    def nbytes(self):
+        return int(self.table.nbytes)
+    
+    def matches(self, activity_ids):
+        """True if the table was built for this catalog order"""
+        return len(activity_ids) == len(self.activity_ids) and np.array_equal(activity_ids, self.activity_ids)
+    
+    def lookup(self, profile, interpolate=True):
+        """Ratings for every activity at one raw profile (stress, anxiety, depression, sleep, steps)"""
+        slices, weights = [], []
+        for value, axis in zip(profile, self.axes):
+            if len(axis) == 1:
+                slices.append(slice(0, 1))
+                weights.append(None)
+                continue
+            value = min(max(float(value), axis[0]), axis[-1])
+            i = int(min(max(np.searchsorted(axis, value, side='right') - 1, 0), len(axis) - 2))
+            w = (value - axis[i]) / (axis[i + 1] - axis[i])
+            if interpolate:
+                slices.append(slice(i, i + 2))
+                weights.append(w)
+            else:
+                nearest = i + 1 if w >= 0.5 else i
+                slices.append(slice(nearest, nearest + 1))
+                weights.append(None)
+        
+        block = self.table[tuple(slices)].astype(np.float64)
+        for w in weights:
+            # Collapse the leading grid axis: either a single point or a weighted pair
+            block = block[0] if w is None else block[0] * (1.0 - w) + block[1] * w
+        return block
+
+
+# Immutable set of fitted components served together (never mutated after publish)
+ModelBundle = namedtuple('ModelBundle', [
+    'version', 'kmeans_model', 'ml_model', 'scaler_cluster', 'scaler_ml', 'training_state', 'compiled_forest',
+    'rating_table'
+])
+
+
+class ModelRegistry:
+    """Holds the live ModelBundle behind a single reference.
+    
+    Serving threads call current() once per request and use that snapshot for
+    every step, so they never mix a new scaler with an old model. Reads take no
+    lock (one attribute read); publish and rollback swap the reference under a
+    lock and keep a short history of previous bundles for rollback.
+    """
+    
+    def __init__(self, history_size=5):
+        self.history_size = history_size
+        self._lock = threading.Lock()
+        self._current = None
+        self._history = []  # previously live bundles, oldest first
+    
+    def current(self):
+        """The live bundle (or None)"""
+        return self._current
+    
+    def publish(self, bundle):
+        """Make bundle live; the previous one goes to the rollback history"""
+        with self._lock:
+            if self._current is not None:
+                self._history.append(self._current)
+                del self._history[:-self.history_size]
+            self._current = bundle
+        return bundle
+    
+    def rollback(self, version=None):
+        """Restore the previous bundle, or the given version from history; returns it"""
+        with self._lock:
+            if not self._history:
+                raise ValueError("No previous model version to roll back to")
+            if version is None:
+                index = len(self._history) - 1
+            else:
+                matches = [i for i, bundle in enumerate(self._history) if bundle.version == version]
+                if not matches:
+                    raise ValueError(f"Model version {version} is not in the rollback history")
+                index = matches[-1]
+            
+            bundle = self._history.pop(index)
+            if self._current is not None:
+                self._history.append(self._current)
+            self._current = bundle
+            return bundle
+    
+    def versions(self):
+        """Live version and rollback history (newest first)"""
+        with self._lock:
+            return {
+                'current': self._current.version if self._current is not None else None,
+                'history': [bundle.version for bundle in reversed(self._history)]
+            }
+
+
+class UserIndex:
+    """O(1) user_id -> cluster label and user_id -> latest profile lookups.
+    
+    User IDs are small, dense integers, so they index NumPy arrays directly
+    (grown by doubling as new IDs arrive); negative or very large IDs fall back
+    to a dict. Writes are serialized by a lock, reads are plain array lookups.
+    """
+    
+    DENSE_LIMIT = 1 << 24
+    PROFILE_COLUMNS = ('Stress_Level', 'Anxiety_Score', 'Depression_Score', 'Sleep_Hours', 'Steps_Per_Day')
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clusters = np.full(0, -1, dtype=np.int32)
+        self.profiles = np.full((0, len(self.PROFILE_COLUMNS)), np.nan)
+        self._overflow = {}  # user_id -> [cluster, profile] for IDs outside the dense range
+    
+    def _grow(self, max_id):
+        size = len(self.clusters)
+        if max_id < size:
+            return
+        new_size = max(max_id + 1, 2 * size, 1024)
+        clusters = np.full(new_size, -1, dtype=np.int32)
+        clusters[:size] = self.clusters
+        profiles = np.full((new_size, self.profiles.shape[1]), np.nan)
+        profiles[:size] = self.profiles
+        # Publish profiles first so a reader never sees a user without its row
+        self.profiles, self.clusters = profiles, clusters
+    
+    def update(self, user_ids, profiles=None, clusters=None):
+        """Set profiles and/or clusters for many users (later rows win for repeated IDs)"""
+        user_ids = np.asarray(user_ids, dtype=np.float64)
+        valid = ~np.isnan(user_ids)
+        user_ids = user_ids[valid].astype(np.int64)
+        if profiles is not None:
+            profiles = np.asarray(profiles, dtype=np.float64)[valid]
+        if clusters is not None:
+            clusters = np.asarray(clusters, dtype=np.float64)[valid]
+        
+        # Keep the last occurrence of each ID
+        _, last = np.unique(user_ids[::-1], return_index=True)
+        keep = np.sort(len(user_ids) - 1 - last)
+        user_ids = user_ids[keep]
+        dense = (user_ids >= 0) & (user_ids < self.DENSE_LIMIT)
+        
+        with self._lock:
+            if dense.any():
+                self._grow(int(user_ids[dense].max()))
+                ids = user_ids[dense]
+                if profiles is not None:
+                    self.profiles[ids] = profiles[keep][dense]
+                if clusters is not None:
+                    labels = clusters[keep][dense]
+                    self.clusters[ids] = np.where(np.isnan(labels), -1, labels).astype(np.int32)
+            
+            for i in np.flatnonzero(~dense):
+                entry = self._overflow.setdefault(int(user_ids[i]), [-1, None])
+                if profiles is not None:
+                    entry[1] = profiles[keep][i]
+                if clusters is not None and not np.isnan(clusters[keep][i]):
+                    entry[0] = int(clusters[keep][i])
+    
+    def cluster(self, user_id, default=0):
+        """Cluster label for a user (default if unknown)"""
+        user_id = int(user_id)
+        if 0 <= user_id < len(self.clusters):
+            label = int(self.clusters[user_id])
+        else:
+            label = self._overflow.get(user_id, [-1, None])[0]
+        return default if label < 0 else label
+    
+    def profile(self, user_id):
+        """Latest known profile dict for a user (None if unknown)"""
+        user_id = int(user_id)
+        if 0 <= user_id < len(self.profiles):
+            row = self.profiles[user_id]
+        else:
+            row = self._overflow.get(user_id, [-1, None])[1]
+        if row is None or np.isnan(row).all():
+            return None
+        return {column: float(value) for column, value in zip(self.PROFILE_COLUMNS, row)}
+    
+    def cluster_map(self):
+        """All known user_id -> cluster labels as a dict"""
+        ids = np.flatnonzero(self.clusters >= 0)
+        mapping = dict(zip(ids.tolist(), self.clusters[ids].tolist()))
+        mapping.update({user_id: entry[0] for user_id, entry in self._overflow.items() if entry[0] >= 0})
+        return mapping
+
 
 class MentalHealthRecommender:
+    # User part of the ML feature vector
+    USER_FEATURE_COLUMNS = ['stress', 'anxiety', 'depression', 'sleep', 'steps', 'cluster']
+    
+    # Activity part of the ML feature vector: (name, source column, keywords) substring flags,
+    # plus duration and exact intensity flags (the same attributes the synthetic ratings use)
+    ACTIVITY_KEYWORD_FEATURES = [
+        ('benefit_stress', 'Benefits', 'stress'),
+        ('benefit_anxiety', 'Benefits', 'anxiety'),
+        ('benefit_depression', 'Benefits', 'depression'),
+        ('benefit_mood', 'Benefits', 'mood'),
+        ('benefit_sleep', 'Benefits', 'sleep'),
+        ('benefit_energy', 'Benefits', 'energy'),
+        ('type_meditation', 'Activity_Type', 'meditation'),
+        ('type_yoga', 'Activity_Type', 'yoga'),
+        ('type_exercise', 'Activity_Type', 'exercise'),
+        ('type_breathing', 'Activity_Type', 'breathing'),
+    ]
+    ACTIVITY_FEATURE_COLUMNS = [name for name, _, _ in ACTIVITY_KEYWORD_FEATURES] + [
+        'duration', 'intensity_low', 'intensity_high'
+    ]
+    
+    # Typed load schema: numeric columns are coerced and downcast, low-cardinality text becomes categorical
+    ACTIVITY_SCHEMA = {
+        'Activity_ID': 'int32',
+        '_activity_id': 'int32',
+        'Duration_Minutes': 'int32',
+        'Activity_Type': 'category',
+        'Intensity_Level': 'category',
+    }
+    INTERACTION_SCHEMA = {
+        'User_ID': 'int32',
+        'Stress_Level': 'float32',
+        'Anxiety_Score': 'float32',
+        'Depression_Score': 'float32',
+        'Sleep_Hours': 'float32',
+        'Steps_Per_Day': 'float32',
+        'Mood_Description': 'category',
+        'Recommended_Activity_ID': 'int32',
+        'Activity_Rating': 'float32',
+        'Timestamp': 'object',  # kept as read
+    }
+    
+    # Profile grid for the distilled rating table: (start, stop, step) per RatingTable.AXES
+    DISTILL_GRID = (
+        (0.0, 10.0, 1.0),
+        (0.0, 10.0, 1.0),
+        (0.0, 10.0, 1.0),
+        (4.0, 10.0, 2.0),
+        (0.0, 16000.0, 4000.0),
+    )
+    
+    # Interaction profile columns and the value used where one is missing
+    PROFILE_DEFAULTS = [('Stress_Level', 0), ('Anxiety_Score', 0), ('Depression_Score', 0),
+                        ('Sleep_Hours', 7), ('Steps_Per_Day', 5000)]
+    
+    # Streaming (MiniBatch) clustering: chunk size, passes, and the row count where 'auto' switches to it
+    CLUSTER_CHUNK_SIZE = 8192
+    CLUSTER_STREAMING_EPOCHS = 3
+    CLUSTER_STREAMING_THRESHOLD = 200000
+    
+    # Incremental learning: trees grown per update, and when to compact with a full retrain
+    INCREMENTAL_TREES = 20
+    FULL_RETRAIN_EVERY = 10
+    MAX_FOREST_TREES = 400
+    
     def create_minimal_ml_model(self):
         """Create a minimal working ML model that always works"""
         print("\n🔧 Creating MINIMAL ML model...")
@@ -50,10 +759,11 @@ class MentalHealthRecommender:
                 base_rating += random.uniform(-0.5, 0.5)
                 base_rating = max(1.0, min(5.0, base_rating))
                 
-                synthetic_data.append([stress, anxiety, depression, sleep, steps, cluster, base_rating])
+                synthetic_data.append([stress, anxiety, depression, sleep, steps, cluster] +
+                                      self._random_activity_features() + [base_rating])
             
             # Convert to DataFrame
-            columns = ['stress', 'anxiety', 'depression', 'sleep', 'steps', 'cluster', 'rating']
+            columns = self.USER_FEATURE_COLUMNS + self.ACTIVITY_FEATURE_COLUMNS + ['rating']
             df = pd.DataFrame(synthetic_data, columns=columns)
             
             # Fit scalers
@@ -99,6 +809,7 @@ class MentalHealthRecommender:
             print(f"   KMeans Model: {type(self.kmeans_model).__name__}")
             print(f"   Scaler fitted: {hasattr(self.scaler_cluster, 'mean_')}")
             
+            self._publish_models()
             return True
             
         except Exception as e:
@@ -131,14 +842,16 @@ class MentalHealthRecommender:
                     cluster = random.randint(0, 3)
                     rating = random.uniform(3, 5)
                     
-                    synthetic_data.append([stress, anxiety, depression, sleep, steps, cluster, rating])
+                    synthetic_data.append([stress, anxiety, depression, sleep, steps, cluster] +
+                                          self._random_activity_features() + [rating])
                 
-                columns = ['stress', 'anxiety', 'depression', 'sleep', 'steps', 'cluster', 'rating']
+                columns = self.USER_FEATURE_COLUMNS + self.ACTIVITY_FEATURE_COLUMNS + ['rating']
                 df = pd.DataFrame(synthetic_data, columns=columns)
                 
                 X = df.drop('rating', axis=1)
                 y = df['rating']
                 
+                self.scaler_ml = StandardScaler()
                 X_scaled = self.scaler_ml.fit_transform(X)
                 self.ml_model.fit(X_scaled, y)
                 print("   ✅ Created basic ML model")
@@ -159,19 +872,23 @@ class MentalHealthRecommender:
                         random.uniform(1000, 15000)
                     ])
                 
+                self.scaler_cluster = StandardScaler()
                 cluster_features_scaled = self.scaler_cluster.fit_transform(synthetic_clusters)
                 self.kmeans_model.fit(cluster_features_scaled)
                 print("   ✅ Created basic KMeans model")
             
+            self._publish_models()
             return True
             
         except Exception as e:
             print(f"   ❌ Failed to create basic models: {e}")
             return False
     def __init__(self, activities_path, interactions_path):
-        self.activities = self._safe_read_csv(activities_path)
-        self.interactions = self._safe_read_csv(interactions_path)
+        self.activities_path = activities_path
+        self.activities = self._safe_read_csv(activities_path, usecols=self._activity_usecols)
+        self.interactions = self._safe_read_csv(interactions_path, usecols=self._interaction_usecols)
         self.ratings_db_path = None  # Will be set for real ratings
+        self.ratings_db = None
 
         # ML model components
         self.kmeans_model = None
@@ -180,6 +897,46 @@ class MentalHealthRecommender:
         self.scaler_ml = StandardScaler()
         self.model_path = os.path.join(os.path.dirname(__file__), 'models')
         os.makedirs(self.model_path, exist_ok=True)
+        
+        # Versioned model artifacts (manifest + content hash, atomic publish)
+        self.artifact_store = ModelArtifactStore(os.path.join(self.model_path, 'artifacts'))
+        self.model_version = None
+        
+        # Serving reads the registry's immutable snapshot; training fills the attributes
+        # above with fresh objects and publishes them as a new bundle when done
+        self.model_registry = ModelRegistry()
+        
+        # 'compiled' serves from the flat-array forest, 'sklearn' calls the estimators directly,
+        # 'table' serves from the distilled profile-grid rating table (built after each full training;
+        # bundles from incremental updates have none and predict with the forest instead)
+        self.inference_backend = os.environ.get('ML_INFERENCE_BACKEND', 'compiled').lower()
+        self.distill_table = (os.environ.get('ML_DISTILL_TABLE', '').lower() in ('1', 'true', 'yes')
+                              or self.inference_backend == 'table')
+        self.table_interpolation = os.environ.get('ML_TABLE_INTERPOLATION', '1').lower() in ('1', 'true', 'yes')
+        
+        # Which ratings the current model has seen (ratings table row id watermark)
+        self.training_state = {
+            'rating_watermark': 0,
+            'incremental_updates': 0,
+            'last_full_retrain': None,
+            'last_incremental_update': None
+        }
+        self._retrain_watermark = None
+        
+        # 'batch' (KMeans), 'streaming' (MiniBatchKMeans over chunks) or 'auto' (streaming for large data)
+        self.clustering_mode = os.environ.get('CLUSTERING_MODE', 'auto').lower()
+        
+        # user_id -> cluster / latest profile (built from interactions, updated as ratings arrive)
+        self.user_index = UserIndex()
+        
+        # Per-activity ML features (filled by _prepare_activities)
+        self.activity_features = np.zeros((0, len(self.ACTIVITY_FEATURE_COLUMNS)))
+        self.activity_ids = np.zeros(0, dtype=np.int64)
+        
+        # activity_id -> row position (dense array, or dict for sparse IDs) and read-only row records
+        self._activity_positions = np.zeros(0, dtype=np.int64)
+        self._activity_position_map = None
+        self._activity_records = []
 
         # Pre-process data
         self._prepare_activities()
@@ -188,6 +945,12 @@ class MentalHealthRecommender:
         # Setup ratings database
         self._setup_ratings_database()
         
+        # Retraining runs in the background so saving a rating never pays for model fitting
+        self.retrain_worker = RetrainWorker(
+            self.continuous_learning_check,
+            debounce_seconds=float(os.environ.get('RETRAIN_DEBOUNCE_SECONDS', 30))
+        )
+        
         # Check for real ratings
         self.real_ratings_count = self._count_ratings()
         
@@ -209,52 +972,45 @@ class MentalHealthRecommender:
             os.makedirs(data_dir, exist_ok=True)
             
             self.ratings_db_path = os.path.join(data_dir, 'user_ratings.db')
-            
-            # Initialize database
-            conn = sqlite3.connect(self.ratings_db_path)
-            cursor = conn.cursor()
-            
-            # Create ratings table
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS activity_ratings (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                activity_id INTEGER NOT NULL,
-                rating REAL NOT NULL,
-                stress_level REAL,
-                anxiety_score REAL,
-                depression_score REAL,
-                sleep_hours REAL,
-                steps_per_day REAL,
-                mood_description TEXT,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(user_id, activity_id)
-            )
-            ''')
-            
-            # Create index for faster queries
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_user_activity ON activity_ratings(user_id, activity_id)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_activity ON activity_ratings(activity_id)')
-            
-            conn.commit()
-            conn.close()
+            self.ratings_db = RatingsDatabase(self.ratings_db_path)
+            
+            with self.ratings_db.writer() as conn:
+                # Create ratings table
+                conn.execute('''
+                CREATE TABLE IF NOT EXISTS activity_ratings (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER NOT NULL,
+                    activity_id INTEGER NOT NULL,
+                    rating REAL NOT NULL,
+                    stress_level REAL,
+                    anxiety_score REAL,
+                    depression_score REAL,
+                    sleep_hours REAL,
+                    steps_per_day REAL,
+                    mood_description TEXT,
+                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE(user_id, activity_id)
+                )
+                ''')
+                
+                # Create index for faster queries
+                conn.execute('CREATE INDEX IF NOT EXISTS idx_user_activity ON activity_ratings(user_id, activity_id)')
+                conn.execute('CREATE INDEX IF NOT EXISTS idx_activity ON activity_ratings(activity_id)')
             
             print(f"✅ Ratings database initialized: {self.ratings_db_path}")
             
         except Exception as e:
             print(f"⚠️ Could not initialize ratings database: {e}")
             self.ratings_db_path = None
+            self.ratings_db = None
     
     def _save_real_rating(self, user_id, activity_id, rating, user_profile=None):
         """Save a real user rating to the database"""
         try:
-            if not self.ratings_db_path:
+            if self.ratings_db is None:
                 print("⚠️ No ratings database available")
                 return False
             
-            conn = sqlite3.connect(self.ratings_db_path)
-            cursor = conn.cursor()
-            
             # Prepare data
             stress = user_profile.get('Stress_Level', 0) if user_profile else 0
             anxiety = user_profile.get('Anxiety_Score', 0) if user_profile else 0
@@ -264,15 +1020,16 @@ class MentalHealthRecommender:
             mood = user_profile.get('Mood_Description', '') if user_profile else ''
             
             # Insert or update rating
-            cursor.execute('''
-            INSERT OR REPLACE INTO activity_ratings 
-            (user_id, activity_id, rating, stress_level, anxiety_score, depression_score, 
-             sleep_hours, steps_per_day, mood_description, timestamp)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-            ''', (user_id, activity_id, rating, stress, anxiety, depression, sleep, steps, mood))
+            with self.ratings_db.writer() as conn:
+                conn.execute('''
+                INSERT OR REPLACE INTO activity_ratings 
+                (user_id, activity_id, rating, stress_level, anxiety_score, depression_score, 
+                 sleep_hours, steps_per_day, mood_description, timestamp)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ''', (user_id, activity_id, rating, stress, anxiety, depression, sleep, steps, mood))
             
-            conn.commit()
-            conn.close()
+            if user_profile:
+                self._index_rated_user(user_id, [stress, anxiety, depression, sleep, steps])
             
             print(f"✅ Saved real rating: User {user_id}, Activity {activity_id}, Rating {rating}")
             return True
@@ -281,13 +1038,25 @@ class MentalHealthRecommender:
             print(f"❌ Error saving real rating: {e}")
             return False
     
+    def _index_rated_user(self, user_id, profile):
+        """Record a rating's profile as the user's latest, assigning a cluster to new users"""
+        try:
+            cluster = None
+            if self.user_index.cluster(user_id, -1) < 0:
+                bundle = self.model_registry.current()
+                compiled = bundle.compiled_forest if bundle is not None else None
+                if compiled is not None and compiled.cluster_centers is not None:
+                    cluster = compiled.assign_cluster(profile)
+            self.user_index.update([user_id], [profile], None if cluster is None else [cluster])
+        except Exception as e:
+            print(f"⚠️ Could not index user {user_id}: {e}")
+    
     def _load_ratings(self):
         """Load real user ratings from database"""
         try:
-            if not self.ratings_db_path or not os.path.exists(self.ratings_db_path):
+            if self.ratings_db is None:
                 return pd.DataFrame()
             
-            conn = sqlite3.connect(self.ratings_db_path)
             query = '''
             SELECT user_id, activity_id, rating, stress_level, anxiety_score, 
                    depression_score, sleep_hours, steps_per_day, mood_description, 
@@ -297,8 +1066,8 @@ class MentalHealthRecommender:
             ORDER BY timestamp DESC
             '''
             
-            ratings_df = pd.read_sql_query(query, conn)
-            conn.close()
+            with self.ratings_db.reader() as conn:
+                ratings_df = pd.read_sql_query(query, conn)
             
             print(f"📊 Loaded {len(ratings_df)} real ratings from database")
             return ratings_df
@@ -310,14 +1079,11 @@ class MentalHealthRecommender:
     def _count_ratings(self):
         """Count total real ratings available"""
         try:
-            if not self.ratings_db_path or not os.path.exists(self.ratings_db_path):
+            if self.ratings_db is None:
                 return 0
             
-            conn = sqlite3.connect(self.ratings_db_path)
-            cursor = conn.cursor()
-            cursor.execute('SELECT COUNT(*) FROM activity_ratings')
-            count = cursor.fetchone()[0]
-            conn.close()
+            with self.ratings_db.reader() as conn:
+                count = conn.execute('SELECT COUNT(*) FROM activity_ratings').fetchone()[0]
             
             return count
             
@@ -326,61 +1092,68 @@ class MentalHealthRecommender:
             return 0
     
     def _get_user_profile_from_interactions(self, user_id):
-        """Get user profile from interactions CSV"""
+        """Get a user's latest known profile (interactions, updated by saved ratings)"""
         try:
-            if self.interactions.empty or 'User_ID' not in self.interactions.columns:
-                return None
-            
-            # Convert User_ID to numeric
-            self.interactions['User_ID'] = pd.to_numeric(self.interactions['User_ID'], errors='coerce')
-            user_data = self.interactions[self.interactions['User_ID'] == user_id]
-            
-            if user_data.empty:
-                return None
-            
-            return {
-                'Stress_Level': float(user_data.iloc[0].get('Stress_Level', 0)),
-                'Anxiety_Score': float(user_data.iloc[0].get('Anxiety_Score', 0)),
-                'Depression_Score': float(user_data.iloc[0].get('Depression_Score', 0)),
-                'Sleep_Hours': float(user_data.iloc[0].get('Sleep_Hours', 7)),
-                'Steps_Per_Day': float(user_data.iloc[0].get('Steps_Per_Day', 5000))
-            }
-            
+            return self.user_index.profile(user_id)
         except Exception as e:
             print(f"⚠️ Error getting user profile for {user_id}: {e}")
             return None
     
-    def _get_real_rating(self, user_id, activity_id):
-        """Get real rating for a user-activity pair"""
+    def _load_rating_lookup(self):
+        """Load every (user_id, activity_id) -> rating pair in one query"""
         try:
-            if not self.ratings_db_path:
-                return None
+            if self.ratings_db is None:
+                return {}
             
-            conn = sqlite3.connect(self.ratings_db_path)
-            cursor = conn.cursor()
+            with self.ratings_db.reader() as conn:
+                cursor = conn.execute('SELECT user_id, activity_id, rating FROM activity_ratings WHERE rating IS NOT NULL')
+                rating_lookup = {(int(user_id), int(activity_id)): float(rating) for user_id, activity_id, rating in cursor}
             
-            cursor.execute('''
-            SELECT rating FROM activity_ratings 
-            WHERE user_id = ? AND activity_id = ?
-            ''', (user_id, activity_id))
+            return rating_lookup
             
-            result = cursor.fetchone()
-            conn.close()
+        except Exception as e:
+            print(f"⚠️ Error loading rating lookup: {e}")
+            return {}
+    
+    def _max_rating_id(self):
+        """Highest ratings-table row id (0 if none); INSERT OR REPLACE always issues a new id"""
+        try:
+            if self.ratings_db is None:
+                return 0
             
-            if result:
-                return float(result[0])
-            return None
+            with self.ratings_db.reader() as conn:
+                return int(conn.execute('SELECT COALESCE(MAX(id), 0) FROM activity_ratings').fetchone()[0])
             
         except Exception as e:
-            print(f"⚠️ Error getting real rating: {e}")
-            return None
+            print(f"⚠️ Error reading rating watermark: {e}")
+            return 0
+    
+    def _load_ratings_since(self, watermark):
+        """Ratings added or updated after the given row id watermark"""
+        try:
+            if self.ratings_db is None:
+                return pd.DataFrame()
+            
+            query = '''
+            SELECT id, user_id, activity_id, rating, stress_level, anxiety_score,
+                   depression_score, sleep_hours, steps_per_day
+            FROM activity_ratings
+            WHERE id > ? AND rating IS NOT NULL
+            ORDER BY id
+            '''
+            with self.ratings_db.reader() as conn:
+                return pd.read_sql_query(query, conn, params=(int(watermark),))
+            
+        except Exception as e:
+            print(f"⚠️ Error loading new ratings: {e}")
+            return pd.DataFrame()
     
     def _prepare_activities(self):
         """Pre-process activities data"""
         if self.activities.empty:
             return
         
-        self.activities = self.activities.copy()
+        self.activities = self.activities.copy(deep=False)
         
         # Create standardized activity ID column
         self.activities['_activity_id'] = None
@@ -397,45 +1170,199 @@ class MentalHealthRecommender:
         self.activities.loc[mask, '_activity_id'] = self.activities[mask].index + 1
         self.activities['_activity_id'] = self.activities['_activity_id'].astype(int)
         
-        # Convert all numeric columns to Python int/float
-        numeric_cols = self.activities.select_dtypes(include=[np.number]).columns
-        for col in numeric_cols:
-            self.activities[col] = self.activities[col].apply(lambda x: int(x) if pd.notna(x) and not isinstance(x, bool) else x)
+        self.activities = self._apply_schema(self.activities, self.ACTIVITY_SCHEMA, 'activities')
+        
+        self._prepare_activity_features()
+    
+    def _prepare_activity_features(self):
+        """Build the (activities x activity-features) matrix used by the ML model"""
+        n = len(self.activities)
+        features = np.zeros((n, len(self.ACTIVITY_FEATURE_COLUMNS)), dtype=np.float64)
+        
+        def lowered(column):
+            if column not in self.activities.columns:
+                return pd.Series('', index=self.activities.index, dtype=object)
+            return self.activities[column].astype(object).fillna('').astype(str).str.lower()
+        
+        for i, (name, column, keyword) in enumerate(self.ACTIVITY_KEYWORD_FEATURES):
+            features[:, i] = lowered(column).str.contains(keyword, regex=False).to_numpy(dtype=bool)
+        
+        offset = len(self.ACTIVITY_KEYWORD_FEATURES)
+        if 'Duration_Minutes' in self.activities.columns:
+            duration = pd.to_numeric(self.activities['Duration_Minutes'], errors='coerce').fillna(20)
+        else:
+            duration = pd.Series(20.0, index=self.activities.index)
+        features[:, offset] = duration.to_numpy(dtype=np.float64)
+        
+        intensity = lowered('Intensity_Level').str.strip()
+        features[:, offset + 1] = (intensity == 'low').to_numpy(dtype=bool)
+        features[:, offset + 2] = (intensity == 'high').to_numpy(dtype=bool)
+        
+        self.activity_features = features
+        self.activity_ids = self.activities['_activity_id'].to_numpy(dtype=np.int64)
+        self._build_activity_index()
+    
+    def _build_activity_index(self):
+        """activity_id -> row position index plus one read-only record per row"""
+        ids, first_positions = np.unique(self.activity_ids, return_index=True)
+        
+        if len(ids) and ids[0] >= 0 and ids[-1] < 4 * len(ids) + 1024:
+            # Small dense IDs: direct array lookup (first row wins for duplicate IDs)
+            positions = np.full(int(ids[-1]) + 1, -1, dtype=np.int64)
+            positions[ids] = first_positions
+            self._activity_positions = positions
+            self._activity_position_map = None
+        else:
+            self._activity_positions = np.zeros(0, dtype=np.int64)
+            self._activity_position_map = dict(zip(ids.tolist(), first_positions.tolist()))
+        
+        # Immutable views of each row: callers can't mutate the catalog, and nothing is copied per lookup
+        self._activity_records = [MappingProxyType(record) for record in self.activities.to_dict('records')]
+    
+    def _activity_position(self, activity_id):
+        """Row position for an activity ID (None if unknown)"""
+        activity_id = int(activity_id)
+        if self._activity_position_map is not None:
+            return self._activity_position_map.get(activity_id)
+        if 0 <= activity_id < len(self._activity_positions):
+            position = int(self._activity_positions[activity_id])
+            return position if position >= 0 else None
+        return None
+    
+    def reload_activities(self, activities_path=None):
+        """Re-read the activities CSV and rebuild features and the activity index"""
+        activities = self._safe_read_csv(activities_path or self.activities_path, usecols=self._activity_usecols)
+        if activities.empty:
+            print("   ⚠️ Activities file empty or unreadable, keeping current catalog")
+            return False
+        
+        self.activities = activities
+        self._prepare_activities()
+        print(f"   ✅ Reloaded {len(self.activities)} activities")
+        return True
+    
+    def _activity_feature_list(self, activity_id):
+        """Activity features for one activity ID as a list (default features if unknown)"""
+        position = self._activity_position(activity_id)
+        if position is None:
+            default = [0.0] * len(self.ACTIVITY_FEATURE_COLUMNS)
+            default[len(self.ACTIVITY_KEYWORD_FEATURES)] = 20.0
+            return default
+        return self.activity_features[position].tolist()
+    
+    def _random_activity_features(self):
+        """Features of a random catalog activity (for synthetic bootstrap data)"""
+        if len(self.activity_features) == 0:
+            return self._activity_feature_list(-1)
+        return self.activity_features[random.randrange(len(self.activity_features))].tolist()
     
     def _prepare_interactions(self):
         """Pre-process interactions data"""
         if self.interactions.empty:
             return
         
-        self.interactions = self.interactions.copy()
+        self.interactions = self.interactions.copy(deep=False)
         
-        # Ensure numeric columns are Python types
+        # Missing scores count as 0
         score_columns = ['Stress_Level', 'Anxiety_Score', 'Depression_Score', 'Sleep_Hours', 'Steps_Per_Day']
         for col in score_columns:
             if col in self.interactions.columns:
-                self.interactions[col] = pd.to_numeric(self.interactions[col], errors='coerce').fillna(0).astype(float)
+                self.interactions[col] = pd.to_numeric(self.interactions[col], errors='coerce').fillna(0)
+        
+        self.interactions = self._apply_schema(self.interactions, self.INTERACTION_SCHEMA, 'interactions')
         
-        # Convert all numeric columns to Python types
-        numeric_cols = self.interactions.select_dtypes(include=[np.number]).columns
-        for col in numeric_cols:
-            self.interactions[col] = self.interactions[col].apply(lambda x: float(x) if pd.notna(x) else x)
+        self._build_user_index()
+    
+    def _interaction_user_ids(self):
+        """Numeric User_ID column as float64 (NaN where missing or invalid)"""
+        if 'User_ID' not in self.interactions.columns:
+            return np.full(len(self.interactions), np.nan)
+        return pd.to_numeric(self.interactions['User_ID'], errors='coerce').to_numpy(dtype=np.float64)
     
-    def _safe_read_csv(self, filepath):
-        """Read CSV with multiple encoding attempts"""
+    def _build_user_index(self):
+        """Rebuild the user -> profile / cluster index from the interactions frame"""
+        self.user_index = UserIndex()
+        if self.interactions.empty:
+            return
+        
+        clusters = None
+        if 'cluster_label' in self.interactions.columns:
+            clusters = pd.to_numeric(self.interactions['cluster_label'], errors='coerce').to_numpy(dtype=np.float64)
+        self.user_index.update(self._interaction_user_ids(), self._interaction_profile_matrix(), clusters)
+    
+    @staticmethod
+    def _activity_usecols(column):
+        """Activities keep every named column (the text fields are shown to users)"""
+        return not str(column).strip().startswith('Unnamed:')
+    
+    @classmethod
+    def _interaction_usecols(cls, column):
+        """Interactions only keep the columns in the schema"""
+        return str(column).strip() in cls.INTERACTION_SCHEMA
+    
+    def _apply_schema(self, df, schema, label):
+        """Coerce columns to the schema dtypes, downcast other numerics, and report memory per column"""
+        before = df.memory_usage(index=False, deep=True)
+        before_dtypes = df.dtypes.astype(str)
+        
+        df = df.copy(deep=False)
+        for col in df.columns:
+            dtype = schema.get(col)
+            if dtype is None and pd.api.types.is_numeric_dtype(df[col]) and not pd.api.types.is_bool_dtype(df[col]):
+                dtype = 'int32' if pd.api.types.is_integer_dtype(df[col]) else 'float32'
+            if dtype is None or dtype == 'object':
+                continue
+            
+            try:
+                if dtype == 'category':
+                    df[col] = df[col].astype('category')
+                else:
+                    values = pd.to_numeric(df[col], errors='coerce')
+                    info = np.iinfo(np.int32)
+                    fits_int32 = (values.notna().all() and (values % 1 == 0).all()
+                                  and (values.empty or (values.min() >= info.min and values.max() <= info.max)))
+                    if dtype == 'int32' and fits_int32:
+                        df[col] = values.astype(np.int32)
+                    elif dtype == 'int32' and values.abs().max() > 2 ** 24:
+                        df[col] = values.astype(np.float64)  # IDs beyond float32 precision
+                    else:
+                        df[col] = values.astype(np.float32)
+            except Exception as e:
+                print(f"   ⚠️ Could not convert {label}.{col} to {dtype}: {e}")
+        
+        after = df.memory_usage(index=False, deep=True)
+        after_dtypes = df.dtypes.astype(str)
+        print(f"   💾 {label} memory: {before.sum() / 1024:.1f} KB → {after.sum() / 1024:.1f} KB")
+        for col in df.columns:
+            print(f"      {col}: {before_dtypes[col]} {before[col] / 1024:.1f} KB → "
+                  f"{after_dtypes[col]} {after[col] / 1024:.1f} KB")
+        return df
+    
+    def _safe_read_csv(self, filepath, usecols=None):
+        """Read CSV (from its binary snapshot when fresh) with multiple encoding attempts"""
         if not os.path.exists(filepath):
             print(f"❌ File not found: {filepath}")
             return pd.DataFrame()
         
         print(f"\n📂 Loading {os.path.basename(filepath)}...")
         
-        encodings = ['utf-8', 'latin-1', 'cp1252', 'iso-8859-1']
+        df = load_snapshot(filepath, usecols=usecols, read_options=ENGINE_READ_OPTIONS)
+        if df is not None and not df.empty:
+            df.columns = df.columns.str.strip()
+            return df
         
-        for encoding in encodings:
+        for encoding in ENGINE_READ_OPTIONS['encodings']:
             try:
                 print(f"   Trying {encoding} encoding...")
-                df = pd.read_csv(filepath, encoding=encoding, on_bad_lines='skip')
+                # The snapshot holds every column, so parse them all when one will be written
+                df = pd.read_csv(filepath, encoding=encoding, on_bad_lines=ENGINE_READ_OPTIONS['on_bad_lines'],
+                                 usecols=None if SNAPSHOTS_ENABLED else usecols)
                 if not df.empty:
                     print(f"   ✅ Successfully loaded with {encoding}")
+                    if SNAPSHOTS_ENABLED:
+                        save_snapshot(df, filepath, ENGINE_READ_OPTIONS)
+                        if usecols is not None:
+                            df = df[[col for col in df.columns if usecols(col)]]
                     df.columns = df.columns.str.strip()
                     return df
             except Exception as e:
@@ -487,68 +1414,113 @@ class MentalHealthRecommender:
             'Depression_Score': depression_score
         }
     
-    def cluster_users(self, n_clusters=5):
+    def _interaction_profile_matrix(self, frame=None):
+        """(rows x 5) float64 matrix of stress, anxiety, depression, sleep, steps (default: all interactions)"""
+        frame = self.interactions if frame is None else frame
+        profiles = np.empty((len(frame), len(self.PROFILE_DEFAULTS)), dtype=np.float64)
+        for j, (column, default) in enumerate(self.PROFILE_DEFAULTS):
+            if column in frame.columns:
+                profiles[:, j] = pd.to_numeric(frame[column], errors='coerce').fillna(default).to_numpy(dtype=np.float64)
+            else:
+                profiles[:, j] = default
+        return profiles
+    
+    def cluster_users(self, n_clusters=5, mode=None):
         """Cluster users based on mental health profiles"""
         if self.interactions.empty:
             print("   ⚠️ No interactions data available for clustering")
             return None
 
-        print(f"\n🎯 Clustering users into {n_clusters} groups...")
-
-        features = []
-        valid_indices = []
-
-        for idx, interaction in self.interactions.iterrows():
-            try:
-                user_features = [
-                    float(interaction.get('Stress_Level', 0)),
-                    float(interaction.get('Anxiety_Score', 0)),
-                    float(interaction.get('Depression_Score', 0)),
-                    float(interaction.get('Sleep_Hours', 7)),
-                    float(interaction.get('Steps_Per_Day', 5000))
-                ]
-                features.append(user_features)
-                valid_indices.append(idx)
-            except Exception as e:
-                continue
+        mode = (mode or self.clustering_mode).lower()
+        if mode == 'auto':
+            mode = 'streaming' if len(self.interactions) >= self.CLUSTER_STREAMING_THRESHOLD else 'batch'
+        
+        print(f"\n🎯 Clustering users into {n_clusters} groups ({mode})...")
 
-        if len(features) < n_clusters:
+        if len(self.interactions) < n_clusters:
             print(f"   ⚠️ Not enough data for clustering")
             return None
 
-        features_scaled = self.scaler_cluster.fit_transform(features)
-        
-        self.kmeans_model = KMeans(n_clusters=n_clusters, random_state=42, n_init=10, max_iter=200)
-        cluster_labels = self.kmeans_model.fit_predict(features_scaled)
+        if mode == 'streaming':
+            cluster_labels = self._cluster_users_streaming(n_clusters)
+        else:
+            features = self._interaction_profile_matrix()
+            
+            # Fresh scaler: the live one may belong to the published model bundle
+            self.scaler_cluster = StandardScaler()
+            features_scaled = self.scaler_cluster.fit_transform(features)
+            
+            self.kmeans_model = KMeans(n_clusters=n_clusters, random_state=42, n_init=10, max_iter=200)
+            cluster_labels = self.kmeans_model.fit_predict(features_scaled)
 
         # Add cluster labels
-        for i, idx in enumerate(valid_indices):
-            self.interactions.at[idx, 'cluster_label'] = int(cluster_labels[i])
+        self.interactions['cluster_label'] = cluster_labels.astype(np.int64)
+        self.user_index.update(self._interaction_user_ids(), clusters=cluster_labels)
 
-        print(f"   ✅ Clustered {len(features)} users into {n_clusters} groups")
+        print(f"   ✅ Clustered {len(cluster_labels)} users into {n_clusters} groups")
         
         return cluster_labels
     
-    def _get_user_clusters(self):
-        """Get user_id to cluster mapping"""
-        user_clusters = {}
+    def _cluster_users_streaming(self, n_clusters):
+        """MiniBatchKMeans fed chunk by chunk from the loaded profile matrix.
+        
+        The profiles are built once from the interactions frame, so labels line up with
+        its rows; scaled copies and distance matrices never exceed one chunk.
+        """
+        profiles = self._interaction_profile_matrix()
+        chunks = lambda: (profiles[start:start + self.CLUSTER_CHUNK_SIZE]
+                          for start in range(0, len(profiles), self.CLUSTER_CHUNK_SIZE))
+        
+        # Pass 1: scaler statistics
+        scaler = StandardScaler()
+        for chunk in chunks():
+            scaler.partial_fit(chunk)
+        
+        # Passes 2..: MiniBatch centroid updates
+        kmeans = MiniBatchKMeans(n_clusters=n_clusters, random_state=42, batch_size=self.CLUSTER_CHUNK_SIZE, n_init=3)
+        initialized = False
+        for _ in range(self.CLUSTER_STREAMING_EPOCHS):
+            for chunk in chunks():
+                if not initialized and len(chunk) < n_clusters:
+                    continue
+                kmeans.partial_fit(scaler.transform(chunk))
+                initialized = True
         
-        if self.interactions.empty or 'cluster_label' not in self.interactions.columns:
-            return user_clusters
+        # Final pass: labels from the final centroids (only the int32 labels are kept)
+        labels = np.concatenate([
+            kmeans.predict(scaler.transform(chunk)).astype(np.int32) for chunk in chunks()
+        ] or [np.zeros(0, dtype=np.int32)])
         
-        for idx, row in self.interactions.iterrows():
-            user_id = row.get('User_ID')
-            cluster = row.get('cluster_label')
-            
-            if pd.notna(user_id) and pd.notna(cluster):
-                user_clusters[int(user_id)] = int(cluster)
+        self.scaler_cluster = scaler
+        self.kmeans_model = kmeans
+        return labels
+    
+    def partial_fit_clusters(self, profiles):
+        """Cluster labels for new interaction profiles (rows of stress, anxiety, depression, sleep, steps).
+        
+        With a MiniBatchKMeans model the centroids also take a partial_fit step on the
+        new rows (no re-clustering); a batch KMeans model only assigns. The updated
+        centroids are served from the next published model bundle.
+        """
+        profiles = np.atleast_2d(np.asarray(profiles, dtype=np.float64))
+        if self.kmeans_model is None or not hasattr(self.scaler_cluster, 'mean_') or len(profiles) == 0:
+            return None
+        
+        scaled = self.scaler_cluster.transform(profiles)
+        if isinstance(self.kmeans_model, MiniBatchKMeans):
+            # Update a copy; the published bundle keeps its own centroids
+            self.kmeans_model = copy.deepcopy(self.kmeans_model)
+            self.kmeans_model.partial_fit(scaled)
         
-        return user_clusters
+        return self.kmeans_model.predict(scaled)
+    
+    def _get_user_clusters(self):
+        """Get user_id to cluster mapping"""
+        return self.user_index.cluster_map()
     
     def _get_user_cluster(self, user_id):
         """Get cluster for a specific user"""
-        user_clusters = self._get_user_clusters()
-        return user_clusters.get(int(user_id), 0)
+        return self.user_index.cluster(user_id, 0)
     
     def train_ml_model_with_real_ratings(self, n_clusters=5):
         """Train ML model using REAL user ratings"""
@@ -571,9 +1543,6 @@ class MentalHealthRecommender:
             print("   ❌ Clustering failed")
             return False
         
-        # Get user clusters
-        user_clusters = self._get_user_clusters()
-        
         # Prepare training data from real ratings
         training_data = []
         
@@ -584,7 +1553,7 @@ class MentalHealthRecommender:
                 real_rating = float(rating_row['rating'])
                 
                 # Get user's cluster
-                user_cluster = user_clusters.get(user_id, 0)
+                user_cluster = self._get_user_cluster(user_id)
                 
                 # Get user profile from ratings or interactions
                 stress = float(rating_row.get('stress_level', 0))
@@ -593,7 +1562,7 @@ class MentalHealthRecommender:
                 sleep = float(rating_row.get('sleep_hours', 7))
                 steps = float(rating_row.get('steps_per_day', 5000))
                 
-                # Create feature vector
+                # Create feature vector (user profile + rated activity)
                 features = [
                     stress,
                     anxiety,
@@ -601,7 +1570,7 @@ class MentalHealthRecommender:
                     sleep,
                     steps,
                     float(user_cluster)
-                ]
+                ] + self._activity_feature_list(activity_id)
                 
                 training_data.append(features + [real_rating])
                 
@@ -630,48 +1599,12 @@ class MentalHealthRecommender:
             print("   ❌ Clustering failed")
             return False
         
-        # Prepare enhanced synthetic training data
-        training_data = []
+        # Real ratings for all (user, activity) pairs, loaded once up front
+        rating_lookup = self._load_rating_lookup()
+        print(f"   📊 Loaded {len(rating_lookup)} real ratings for lookup")
         
-        for idx, interaction in self.interactions.iterrows():
-            try:
-                if pd.isna(interaction.get('cluster_label')):
-                    continue
-                
-                user_cluster = int(interaction.get('cluster_label', 0))
-                
-                # Sample activities
-                n_samples = min(15, len(self.activities))
-                sample_activities = self.activities.sample(n_samples, random_state=idx).iterrows()
-                
-                for act_idx, activity in sample_activities:
-                    activity_id = self._get_activity_id_from_activity(activity)
-                    
-                    # Create features
-                    features = [
-                        float(interaction.get('Stress_Level', 0)),
-                        float(interaction.get('Anxiety_Score', 0)),
-                        float(interaction.get('Depression_Score', 0)),
-                        float(interaction.get('Sleep_Hours', 7)),
-                        float(interaction.get('Steps_Per_Day', 5000)),
-                        float(user_cluster)
-                    ]
-                    
-                    # Get rating - try real first, then enhanced synthetic
-                    user_id = interaction.get('User_ID')
-                    if user_id and pd.notna(user_id):
-                        real_rating = self._get_real_rating(int(user_id), activity_id)
-                        if real_rating is not None:
-                            rating = real_rating
-                        else:
-                            rating = self._calculate_enhanced_synthetic_rating(interaction, activity)
-                    else:
-                        rating = self._calculate_enhanced_synthetic_rating(interaction, activity)
-                    
-                    training_data.append(features + [rating])
-                    
-            except Exception as e:
-                continue
+        # Prepare enhanced synthetic training data (15 sampled activities per user)
+        training_data = self._build_synthetic_training_matrix(samples_per_user=15, rating_lookup=rating_lookup)
         
         if len(training_data) < 20:
             print(f"   ⚠️ Not enough training data ({len(training_data)} samples)")
@@ -694,8 +1627,6 @@ class MentalHealthRecommender:
         if self.kmeans_model is None:
             self.cluster_users(n_clusters)
         
-        user_clusters = self._get_user_clusters()
-        
         # Combine real and synthetic data
         all_training_data = []
         
@@ -704,7 +1635,7 @@ class MentalHealthRecommender:
         for idx, rating_row in real_ratings_df.iterrows():
             try:
                 user_id = int(rating_row['user_id'])
-                user_cluster = user_clusters.get(user_id, 0)
+                user_cluster = self._get_user_cluster(user_id)
                 
                 features = [
                     float(rating_row.get('stress_level', 0)),
@@ -713,7 +1644,7 @@ class MentalHealthRecommender:
                     float(rating_row.get('sleep_hours', 7)),
                     float(rating_row.get('steps_per_day', 5000)),
                     float(user_cluster)
-                ]
+                ] + self._activity_feature_list(int(rating_row['activity_id']))
                 
                 all_training_data.append(features + [float(rating_row['rating'])])
                 real_count += 1
@@ -725,29 +1656,11 @@ class MentalHealthRecommender:
         if synthetic_needed > 0 and not self.interactions.empty:
             print(f"   Adding {synthetic_needed} synthetic ratings for balance")
             
-            for i in range(synthetic_needed):
-                try:
-                    # Random interaction
-                    interaction = self.interactions.sample(1).iloc[0]
-                    user_cluster = int(interaction.get('cluster_label', 0))
-                    
-                    # Random activity
-                    activity = self.activities.sample(1).iloc[0]
-                    
-                    features = [
-                        float(interaction.get('Stress_Level', 0)),
-                        float(interaction.get('Anxiety_Score', 0)),
-                        float(interaction.get('Depression_Score', 0)),
-                        float(interaction.get('Sleep_Hours', 7)),
-                        float(interaction.get('Steps_Per_Day', 5000)),
-                        float(user_cluster)
-                    ]
-                    
-                    rating = self._calculate_enhanced_synthetic_rating(interaction, activity)
-                    all_training_data.append(features + [rating])
-                    
-                except Exception as e:
-                    continue
+            synthetic_rows = self._sample_synthetic_training_rows(synthetic_needed)
+            all_training_data = np.vstack([
+                np.asarray(all_training_data, dtype=np.float64).reshape(-1, synthetic_rows.shape[1]),
+                synthetic_rows
+            ])
         
         print(f"   📊 Training with {real_count} real + {len(all_training_data)-real_count} synthetic ratings")
         return self._train_with_data(all_training_data, "hybrid")
@@ -759,7 +1672,7 @@ class MentalHealthRecommender:
             return False
         
         # Convert to DataFrame
-        columns = ['stress', 'anxiety', 'depression', 'sleep', 'steps', 'cluster', 'rating']
+        columns = self.USER_FEATURE_COLUMNS + self.ACTIVITY_FEATURE_COLUMNS + ['rating']
         df_train = pd.DataFrame(training_data, columns=columns)
         
         # Ensure rating variation
@@ -775,7 +1688,8 @@ class MentalHealthRecommender:
         X = df_train.drop('rating', axis=1)
         y = df_train['rating']
         
-        # Scale features for ML
+        # Scale features for ML (fresh scaler, the published bundle keeps its own)
+        self.scaler_ml = StandardScaler()
         X_scaled = self.scaler_ml.fit_transform(X)
         
         # Split data
@@ -805,117 +1719,258 @@ class MentalHealthRecommender:
         print(f"   Prediction range: {y_pred.min():.2f} - {y_pred.max():.2f}")
         print(f"   Rating std in predictions: {y_pred.std():.3f}")
         
+        # Full retrain: the model now covers every rating up to the watermark
+        watermark = self._retrain_watermark if self._retrain_watermark is not None else self._max_rating_id()
+        self.training_state.update(
+            rating_watermark=int(watermark),
+            incremental_updates=0,
+            last_full_retrain=datetime.now().isoformat()
+        )
+        
         # Save models
         self._save_models()
         
         return True
     
-    def _calculate_enhanced_synthetic_rating(self, interaction, activity):
-        """Enhanced synthetic rating calculation"""
-        try:
-            if isinstance(activity, pd.Series):
-                activity_dict = activity.to_dict()
+    def _interaction_training_arrays(self, missing_cluster=None):
+        """Profile (n x 5, see PROFILE_DEFAULTS), cluster and user ID arrays for clustered interactions.
+        
+        If the interactions have no cluster_label column yet, every row gets missing_cluster
+        (or no rows are returned when it is None).
+        """
+        if self.interactions.empty:
+            return np.zeros((0, len(self.PROFILE_DEFAULTS))), np.zeros(0), np.zeros(0)
+        
+        if 'cluster_label' in self.interactions.columns:
+            clusters = pd.to_numeric(self.interactions['cluster_label'], errors='coerce')
+        elif missing_cluster is not None:
+            clusters = pd.Series(float(missing_cluster), index=self.interactions.index)
+        else:
+            return np.zeros((0, len(self.PROFILE_DEFAULTS))), np.zeros(0), np.zeros(0)
+        
+        valid = clusters.notna().to_numpy()
+        profiles = self._interaction_profile_matrix()[valid]
+        
+        if 'User_ID' in self.interactions.columns:
+            user_ids = pd.to_numeric(self.interactions['User_ID'], errors='coerce').to_numpy(dtype=np.float64)[valid]
+        else:
+            user_ids = np.full(len(profiles), np.nan)
+        
+        return profiles, clusters.to_numpy(dtype=np.float64)[valid], user_ids
+    
+    def _synthetic_ratings(self, profiles, activity_rows, rng):
+        """Vectorized enhanced synthetic ratings for aligned (profile, activity feature) rows"""
+        column = {name: i for i, name in enumerate(self.ACTIVITY_FEATURE_COLUMNS)}
+        flag = lambda name: activity_rows[:, column[name]] > 0
+        stress, anxiety, depression, sleep, steps = profiles.T
+        duration = activity_rows[:, column['duration']]
+        
+        adjustment = np.zeros(len(profiles), dtype=np.float64)
+        
+        # Score-based matching with weights
+        adjustment += np.where(flag('benefit_stress') & (stress > 5), (stress - 5) * 0.1 * np.where(stress > 7, 1.2, 1.0), 0.0)
+        adjustment += np.where(flag('benefit_anxiety') & (anxiety > 5), (anxiety - 5) * 0.12 * np.where(anxiety > 7, 1.3, 1.0), 0.0)
+        adjustment += np.where(flag('benefit_depression') & (depression > 5), (depression - 5) * 0.1 * np.where(depression > 7, 1.1, 1.0), 0.0)
+        adjustment += 0.3 * (flag('benefit_mood') & (depression > 4))
+        adjustment += 0.4 * (flag('benefit_sleep') & (sleep < 6))
+        adjustment += 0.3 * (flag('benefit_energy') & (steps < 4000))
+        
+        # Activity type matching
+        adjustment += 0.5 * (flag('type_meditation') & (anxiety > 6))
+        adjustment += 0.4 * (flag('type_yoga') & (stress > 5))
+        adjustment += 0.4 * (flag('type_exercise') & (depression > 5))
+        adjustment += 0.5 * (flag('type_breathing') & ((anxiety > 6) | (stress > 6)))
+        
+        # Duration and intensity consideration
+        adjustment -= 0.3 * ((sleep < 6) & (duration > 30))
+        adjustment -= 0.2 * ((steps > 10000) & (duration < 15))
+        adjustment -= 0.4 * (flag('intensity_high') & ((stress > 8) | (anxiety > 8)))
+        adjustment -= 0.2 * (flag('intensity_low') & (depression > 7))
+        
+        # Add controlled randomness
+        adjustment += rng.uniform(-0.2, 0.2, len(profiles))
+        
+        return np.round(np.clip(3.0 + adjustment, 1.0, 5.0), 2)
+    
+    def _assemble_training_rows(self, profiles, clusters, activity_rows, ratings):
+        """Stack user features, activity features and rating into training rows"""
+        n_user = len(self.USER_FEATURE_COLUMNS)
+        rows = np.empty((len(profiles), n_user + activity_rows.shape[1] + 1), dtype=np.float64)
+        rows[:, :n_user - 1] = profiles
+        rows[:, n_user - 1] = clusters
+        rows[:, n_user:-1] = activity_rows
+        rows[:, -1] = ratings
+        return rows
+    
+    def _build_synthetic_training_matrix(self, samples_per_user=15, rating_lookup=None, seed=42):
+        """Synthetic training matrix: each clustered user paired with distinct sampled activities.
+        
+        Returns a float64 array with USER + ACTIVITY feature columns and the rating last.
+        Real ratings from rating_lookup replace synthetic ones for matching (user, activity) pairs.
+        """
+        rng = np.random.default_rng(seed)
+        profiles, clusters, user_ids = self._interaction_training_arrays()
+        n_users, n_activities = len(profiles), len(self.activity_features)
+        width = len(self.USER_FEATURE_COLUMNS) + len(self.ACTIVITY_FEATURE_COLUMNS) + 1
+        
+        if n_users == 0 or n_activities == 0:
+            return np.zeros((0, width))
+        
+        k = min(samples_per_user, n_activities)
+        
+        # Distinct activities per user: k smallest random keys per row, chunked to bound memory
+        chunk_rows = max(1, (1 << 22) // n_activities)
+        positions = np.empty((n_users, k), dtype=np.int64)
+        for start in range(0, n_users, chunk_rows):
+            stop = min(start + chunk_rows, n_users)
+            if k == n_activities:
+                positions[start:stop] = np.arange(n_activities)
             else:
-                activity_dict = self._activity_to_dict(activity)
-            
-            # User scores
-            stress = float(interaction.get('Stress_Level', 0))
-            anxiety = float(interaction.get('Anxiety_Score', 0))
-            depression = float(interaction.get('Depression_Score', 0))
-            sleep = float(interaction.get('Sleep_Hours', 7))
-            steps = float(interaction.get('Steps_Per_Day', 5000))
-            
-            # Activity attributes
-            benefits = str(activity_dict.get('Benefits', activity_dict.get('benefits', ''))).lower()
-            category = str(activity_dict.get('Category', activity_dict.get('category', ''))).lower()
-            activity_type = str(activity_dict.get('Activity_Type', activity_dict.get('type', ''))).lower()
-            duration = float(activity_dict.get('Duration_Minutes', activity_dict.get('duration', 20)))
-            intensity = str(activity_dict.get('Intensity_Level', activity_dict.get('intensity', 'Medium'))).lower()
-            
-            # Base rating with more sophisticated calculation
-            base_rating = 3.0
-            adjustment = 0
-            
-            # Score-based matching with weights
-            weights = {
-                'stress': 1.2 if stress > 7 else 1.0,
-                'anxiety': 1.3 if anxiety > 7 else 1.0,
-                'depression': 1.1 if depression > 7 else 1.0
-            }
-            
-            # Check each benefit
-            if 'stress' in benefits and stress > 5:
-                adjustment += (stress - 5) * 0.1 * weights['stress']
-            if 'anxiety' in benefits and anxiety > 5:
-                adjustment += (anxiety - 5) * 0.12 * weights['anxiety']
-            if 'depression' in benefits and depression > 5:
-                adjustment += (depression - 5) * 0.1 * weights['depression']
-            if 'mood' in benefits and depression > 4:
-                adjustment += 0.3
-            if 'sleep' in benefits and sleep < 6:
-                adjustment += 0.4
-            if 'energy' in benefits and steps < 4000:
-                adjustment += 0.3
-            
-            # Activity type matching
-            if 'meditation' in activity_type and anxiety > 6:
-                adjustment += 0.5
-            if 'yoga' in activity_type and stress > 5:
-                adjustment += 0.4
-            if 'exercise' in activity_type and depression > 5:
-                adjustment += 0.4
-            if 'breathing' in activity_type and (anxiety > 6 or stress > 6):
-                adjustment += 0.5
-            
-            # Duration consideration
-            if sleep < 6 and duration > 30:  # Tired users prefer shorter activities
-                adjustment -= 0.3
-            if steps > 10000 and duration < 15:  # Active users might prefer longer
-                adjustment -= 0.2
-            
-            # Intensity consideration
-            if intensity == 'high' and (stress > 8 or anxiety > 8):
-                adjustment -= 0.4  # High intensity might be too much
-            if intensity == 'low' and depression > 7:
-                adjustment -= 0.2  # Low intensity might not help depression
-            
-            # Add controlled randomness
-            adjustment += random.uniform(-0.2, 0.2)
-            
-            # Calculate final rating
-            final_rating = base_rating + adjustment
-            final_rating = min(5.0, max(1.0, final_rating))
-            
-            return round(final_rating, 2)
-            
-        except Exception as e:
-            return random.uniform(2.5, 3.5)
+                keys = rng.random((stop - start, n_activities))
+                positions[start:stop] = np.argpartition(keys, k - 1, axis=1)[:, :k]
+        positions = positions.ravel()
+        
+        pair_profiles = np.repeat(profiles, k, axis=0)
+        pair_activities = self.activity_features[positions]
+        ratings = self._synthetic_ratings(pair_profiles, pair_activities, rng)
+        
+        # Override with real ratings where available (users with a non-zero ID)
+        if rating_lookup:
+            pair_users = np.repeat(user_ids, k)
+            has_user = ~np.isnan(pair_users) & (pair_users != 0)
+            lookup_keys = np.array(list(rating_lookup.keys()), dtype=np.int64)
+            lookup_values = np.array(list(rating_lookup.values()), dtype=np.float64)
+            
+            # Encode (user, activity) pairs as single int64 keys and match with searchsorted
+            base = int(max(lookup_keys[:, 1].max(), self.activity_ids.max())) + 1
+            encoded = lookup_keys[:, 0] * base + lookup_keys[:, 1]
+            order = np.argsort(encoded)
+            encoded, lookup_values = encoded[order], lookup_values[order]
+            
+            pair_keys = np.where(has_user, pair_users, -1).astype(np.int64) * base + self.activity_ids[positions]
+            found = np.clip(np.searchsorted(encoded, pair_keys), 0, len(encoded) - 1)
+            matched = has_user & (encoded[found] == pair_keys)
+            ratings[matched] = lookup_values[found[matched]]
+        
+        return self._assemble_training_rows(pair_profiles, np.repeat(clusters, k), pair_activities, ratings)
+    
+    def _sample_synthetic_training_rows(self, n_rows, seed=42):
+        """n_rows synthetic training rows from random (clustered user, activity) pairs"""
+        rng = np.random.default_rng(seed)
+        profiles, clusters, _ = self._interaction_training_arrays(missing_cluster=0)
+        width = len(self.USER_FEATURE_COLUMNS) + len(self.ACTIVITY_FEATURE_COLUMNS) + 1
+        
+        if len(profiles) == 0 or len(self.activity_features) == 0 or n_rows <= 0:
+            return np.zeros((0, width))
+        
+        users = rng.integers(0, len(profiles), n_rows)
+        positions = rng.integers(0, len(self.activity_features), n_rows)
+        pair_activities = self.activity_features[positions]
+        ratings = self._synthetic_ratings(profiles[users], pair_activities, rng)
+        return self._assemble_training_rows(profiles[users], clusters[users], pair_activities, ratings)
     
     def train_ml_model(self, n_clusters=5):
         """Main training method - chooses best approach based on available data"""
         print(f"\n🤖 Training ML model with optimal approach...")
         
+        # Everything up to this row id is part of the full retrain (recorded in the artifact)
+        self._retrain_watermark = self._max_rating_id()
+        
         # Check how many real ratings we have
         ratings_count = self._count_ratings()
         print(f"   Available real ratings: {ratings_count}")
         
-        if ratings_count >= 50:
-            print("   ✅ Using REAL ratings training (≥50 ratings)")
-            return self.train_ml_model_with_real_ratings(n_clusters)
-        elif ratings_count >= 10:
-            print("   ⚡ Using HYBRID training (10-49 ratings)")
-            return self.train_ml_model_hybrid(n_clusters)
-        else:
-            print("   🔄 Using ENHANCED synthetic training (<10 ratings)")
-            return self.train_ml_model_enhanced(n_clusters)
+        try:
+            if ratings_count >= 50:
+                print("   ✅ Using REAL ratings training (≥50 ratings)")
+                return self.train_ml_model_with_real_ratings(n_clusters)
+            elif ratings_count >= 10:
+                print("   ⚡ Using HYBRID training (10-49 ratings)")
+                return self.train_ml_model_hybrid(n_clusters)
+            else:
+                print("   🔄 Using ENHANCED synthetic training (<10 ratings)")
+                return self.train_ml_model_enhanced(n_clusters)
+        finally:
+            self._retrain_watermark = None
     
-    def _calculate_synthetic_rating(self, interaction, activity_id):
-        """Legacy method - use enhanced version"""
-        activity = self.get_activity_by_id(activity_id)
-        if activity is None:
-            return random.uniform(2.5, 3.5)
+    def update_ml_model_incremental(self, n_clusters=5):
+        """Fold ratings newer than the watermark into the forest by growing extra trees.
+        
+        Cost scales with the new ratings, not the full history. Falls back to a full
+        retrain (compaction) every FULL_RETRAIN_EVERY updates, when the forest would
+        exceed MAX_FOREST_TREES, or when the current model can't be extended.
+        """
+        print(f"\n🌱 Incremental ML model update...")
+        
+        watermark = int(self.training_state.get('rating_watermark', 0))
+        new_ratings = self._load_ratings_since(watermark)
+        if new_ratings.empty:
+            print("   ℹ️ No new ratings since last update")
+            return False
+        
+        n_features = len(self.USER_FEATURE_COLUMNS) + len(self.ACTIVITY_FEATURE_COLUMNS)
+        can_extend = (
+            isinstance(self.ml_model, RandomForestRegressor) and
+            hasattr(self.ml_model, 'estimators_') and
+            getattr(self.scaler_ml, 'n_features_in_', None) == n_features and
+            self.kmeans_model is not None
+        )
+        if not can_extend:
+            print("   ⚠️ Current model can't be extended, running full retrain")
+            return self.train_ml_model(n_clusters)
+        if self.training_state.get('incremental_updates', 0) >= self.FULL_RETRAIN_EVERY:
+            print(f"   🧹 {self.FULL_RETRAIN_EVERY} incremental updates since last full retrain, compacting")
+            return self.train_ml_model(n_clusters)
+        if self.ml_model.n_estimators + self.INCREMENTAL_TREES > self.MAX_FOREST_TREES:
+            print(f"   🧹 Forest would exceed {self.MAX_FOREST_TREES} trees, compacting")
+            return self.train_ml_model(n_clusters)
         
-        return self._calculate_enhanced_synthetic_rating(interaction, activity)
+        try:
+            # Ratings store the profile columns in lower case
+            profiles = self._interaction_profile_matrix(
+                new_ratings.rename(columns={column.lower(): column for column, _ in self.PROFILE_DEFAULTS}))
+            rows = []
+            for profile, rating_row in zip(profiles.tolist(), new_ratings.itertuples(index=False)):
+                rows.append(profile + [float(self._get_user_cluster(rating_row.user_id))] +
+                            self._activity_feature_list(int(rating_row.activity_id)) + [float(rating_row.rating)])
+            
+            # Replay a proportional synthetic sample so the new trees stay anchored to the full profile space
+            # (seeded per update: reproducible, but each update replays a different sample)
+            replay = self._sample_synthetic_training_rows(max(4 * len(rows), 100),
+                                                          seed=42 + int(self.training_state.get('incremental_updates', 0)))
+            data = np.vstack([np.asarray(rows, dtype=np.float64).reshape(-1, n_features + 1), replay])
+            
+            X_scaled = self.scaler_ml.transform(pd.DataFrame(data[:, :-1], columns=self.USER_FEATURE_COLUMNS + self.ACTIVITY_FEATURE_COLUMNS))
+            
+            # Grow only the new trees, with the live forest's hyperparameters (seeded per update)
+            params = self.ml_model.get_params()
+            params.update(n_estimators=self.INCREMENTAL_TREES, warm_start=False,
+                          random_state=42 + int(self.training_state.get('incremental_updates', 0)) + 1)
+            grown = RandomForestRegressor(**params).fit(X_scaled, data[:, -1])
+            
+            # Replacement forest: a shallow copy with a new estimators list, so existing trees are shared
+            # (never copied) and the live forest stays untouched until the swap
+            forest = copy.copy(self.ml_model)
+            forest.estimators_ = list(self.ml_model.estimators_) + list(grown.estimators_)
+            forest.n_estimators = len(forest.estimators_)
+            self.ml_model = forest
+            
+            self.training_state.update(
+                rating_watermark=int(new_ratings['id'].max()),
+                incremental_updates=int(self.training_state.get('incremental_updates', 0)) + 1,
+                last_incremental_update=datetime.now().isoformat()
+            )
+            print(f"   ✅ Added {self.INCREMENTAL_TREES} trees from {len(rows)} new ratings "
+                  f"(+{len(replay)} replay), forest size {self.ml_model.n_estimators}")
+            
+            # Distilling costs far more than the update; the next full retrain rebuilds the table
+            self._save_models(distill=False)
+            return True
+            
+        except Exception as e:
+            print(f"   ❌ Incremental update failed: {e}, running full retrain")
+            traceback.print_exc()
+            return self.train_ml_model(n_clusters)
     
     def _activity_to_dict(self, activity):
         """Safely convert activity to dictionary with Python types"""
@@ -941,44 +1996,165 @@ class MentalHealthRecommender:
         
         return result
     
-    def _save_models(self):
-        """Save trained models to disk"""
+    def _save_models(self, distill=True):
+        """Publish the trained models as one versioned artifact (with a rating table if distill_table and distill)"""
         try:
-            models_to_save = {
-                'kmeans_model.pkl': self.kmeans_model,
-                'ml_model.pkl': self.ml_model,
-                'scaler_cluster.pkl': self.scaler_cluster,
-                'scaler_ml.pkl': self.scaler_ml
+            compiled_forest = self._compile_models()
+            rating_table = None
+            if self.distill_table and distill:
+                rating_table = self.distill_rating_table(self._workspace_bundle(compiled_forest=compiled_forest))
+            
+            bundle = {
+                'kmeans_model': self.kmeans_model,
+                'ml_model': self.ml_model,
+                'scaler_cluster': self.scaler_cluster,
+                'scaler_ml': self.scaler_ml,
+                'compiled_forest': compiled_forest,
+                'rating_table': rating_table
+            }
+            metadata = {
+                'training_state': self.training_state,
+                'feature_columns': self.USER_FEATURE_COLUMNS + self.ACTIVITY_FEATURE_COLUMNS,
+                'rating_table': rating_table.report if rating_table is not None else None
             }
             
-            for filename, model in models_to_save.items():
-                if model is not None:
-                    with open(os.path.join(self.model_path, filename), 'wb') as f:
-                        pickle.dump(model, f)
-            
-            print("   💾 Models saved")
+            self.model_version = self.artifact_store.publish(bundle, metadata)
+            print(f"   💾 Models saved (version {self.model_version})")
             
         except Exception as e:
             print(f"   ❌ Error saving models: {e}")
+            self.model_version = None
+            compiled_forest = rating_table = None
+        
+        # Serve the new models even if persisting them failed
+        self._publish_models(self.model_version, compiled_forest, rating_table)
     
-    def load_models(self):
-        """Load trained models from disk"""
+    def _compile_models(self, ml_model=None, scaler_ml=None, kmeans_model=None, scaler_cluster=None):
+        """Flat-array compilation of the forest (default: current attributes); None if not possible"""
         try:
-            models_to_load = {
-                'kmeans_model.pkl': 'kmeans_model',
-                'ml_model.pkl': 'ml_model',
-                'scaler_cluster.pkl': 'scaler_cluster',
-                'scaler_ml.pkl': 'scaler_ml'
-            }
+            return CompiledForest.compile(
+                ml_model if ml_model is not None else self.ml_model,
+                scaler_ml if scaler_ml is not None else self.scaler_ml,
+                kmeans_model if kmeans_model is not None else self.kmeans_model,
+                scaler_cluster if scaler_cluster is not None else self.scaler_cluster
+            )
+        except Exception as e:
+            print(f"   ⚠️ Could not compile forest: {e}")
+            return None
+    
+    def _workspace_bundle(self, version=None, compiled_forest=None, rating_table=None):
+        """ModelBundle built from the current component attributes"""
+        return ModelBundle(
+            version=version,
+            kmeans_model=self.kmeans_model,
+            ml_model=self.ml_model,
+            scaler_cluster=self.scaler_cluster,
+            scaler_ml=self.scaler_ml,
+            training_state=dict(self.training_state),
+            compiled_forest=compiled_forest or self._compile_models(),
+            rating_table=rating_table
+        )
+    
+    def _publish_models(self, version=None, compiled_forest=None, rating_table=None):
+        """Swap the current component attributes in as the live, immutable model bundle"""
+        version = version or f"mem-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}"
+        bundle = self._workspace_bundle(version, compiled_forest, rating_table)
+        self.model_version = version
+        self.model_registry.publish(bundle)
+        print(f"   🔁 Serving model version {version}")
+        return bundle
+    
+    def _adopt_bundle(self, bundle):
+        """Point the training attributes at a bundle's components (after rollback/load)"""
+        self.kmeans_model = bundle.kmeans_model
+        self.ml_model = bundle.ml_model
+        self.scaler_cluster = bundle.scaler_cluster
+        self.scaler_ml = bundle.scaler_ml
+        self.training_state = dict(bundle.training_state)
+        self.model_version = bundle.version
+    
+    def rollback_model(self, version=None):
+        """Roll serving back to the previous model version (or a specific one).
+        
+        Looks in the in-memory history first, then in the published artifacts;
+        the restored version also becomes the artifact store's current one.
+        Returns the live version, or None if there was nothing to roll back to.
+        """
+        print(f"\n⏪ Rolling back model{f' to {version}' if version else ''}...")
+        try:
+            try:
+                bundle = self.model_registry.rollback(version)
+            except ValueError:
+                if version is None or version not in self.artifact_store.list_versions():
+                    raise
+                loaded, manifest = self.artifact_store.load(version, verify_hash=True)
+                bundle = self.model_registry.publish(ModelBundle(
+                    version=version,
+                    kmeans_model=loaded['kmeans_model'],
+                    ml_model=loaded['ml_model'],
+                    scaler_cluster=loaded['scaler_cluster'],
+                    scaler_ml=loaded['scaler_ml'],
+                    training_state=manifest.get('metadata', {}).get('training_state', {}),
+                    compiled_forest=loaded.get('compiled_forest') or self._compile_models(
+                        loaded['ml_model'], loaded['scaler_ml'], loaded['kmeans_model'], loaded['scaler_cluster']),
+                    rating_table=loaded.get('rating_table')
+                ))
+            
+            self._adopt_bundle(bundle)
+            if bundle.version in self.artifact_store.list_versions():
+                self.artifact_store.set_current(bundle.version)
+            
+            print(f"   ✅ Serving model version {bundle.version}")
+            return bundle.version
             
-            for filename, attr_name in models_to_load.items():
-                filepath = os.path.join(self.model_path, filename)
-                if os.path.exists(filepath):
-                    with open(filepath, 'rb') as f:
-                        setattr(self, attr_name, pickle.load(f))
-                    print(f"   📂 Loaded {filename}")
-                else:
+        except Exception as e:
+            print(f"   ❌ Rollback failed: {e}")
+            return None
+    
+    def get_model_versions(self):
+        """Live model version, in-memory rollback history and published artifact versions"""
+        versions = self.model_registry.versions()
+        versions['published'] = self.artifact_store.list_versions()
+        return versions
+    
+    def _load_legacy_models(self):
+        """Load the pre-artifact set of four pickles (all must exist)"""
+        models_to_load = {
+            'kmeans_model.pkl': 'kmeans_model',
+            'ml_model.pkl': 'ml_model',
+            'scaler_cluster.pkl': 'scaler_cluster',
+            'scaler_ml.pkl': 'scaler_ml'
+        }
+        
+        # A partial set must not leave e.g. a KMeans without its scaler behind
+        if not all(os.path.exists(os.path.join(self.model_path, filename)) for filename in models_to_load):
+            return False
+        
+        for filename, attr_name in models_to_load.items():
+            with open(os.path.join(self.model_path, filename), 'rb') as f:
+                setattr(self, attr_name, pickle.load(f))
+            print(f"   📂 Loaded {filename}")
+        
+        return True
+    
+    def load_models(self):
+        """Load trained models from disk (current artifact version, else legacy pickles)"""
+        try:
+            bundle, manifest = self.artifact_store.load()
+            if bundle is None:
+                if not self._load_legacy_models():
                     return False
+                self._publish_models('legacy-pickles')
+                return True
+            
+            self.kmeans_model = bundle['kmeans_model']
+            self.ml_model = bundle['ml_model']
+            self.scaler_cluster = bundle['scaler_cluster']
+            self.scaler_ml = bundle['scaler_ml']
+            self.training_state.update(manifest.get('metadata', {}).get('training_state', {}))
+            self.model_version = manifest['version']
+            print(f"   📂 Loaded model artifact {self.model_version}")
+            self._publish_models(self.model_version, bundle.get('compiled_forest'), bundle.get('rating_table'))
             
             return True
             
@@ -1019,11 +2195,120 @@ class MentalHealthRecommender:
         
         return success
     
-    def predict_activity_ratings(self, user_profile):
-        """Predict ratings for all activities - FIXED VERSION"""
-        if self.ml_model is None or self.kmeans_model is None or self.activities.empty:
+    def _bundle_predictor(self, bundle):
+        """(assign_clusters, predict) functions over raw arrays for a bundle"""
+        compiled = bundle.compiled_forest
+        if compiled is not None and compiled.cluster_centers is not None:
+            assign_clusters = compiled.assign_clusters
+        else:
+            assign_clusters = lambda profiles: bundle.kmeans_model.predict(bundle.scaler_cluster.transform(profiles))
+        # sklearn's parallel batch prediction is the faster choice for large offline batches
+        predict = lambda rows: bundle.ml_model.predict(bundle.scaler_ml.transform(rows))
+        return assign_clusters, predict
+    
+    def _predict_profiles(self, profiles, assign_clusters, predict, chunk_points=2048):
+        """(profiles x activities) ratings for raw profile rows, in chunks"""
+        n_activities = len(self.activity_features)
+        n_user = len(self.USER_FEATURE_COLUMNS)
+        ratings = np.empty((len(profiles), n_activities), dtype=np.float64)
+        for start in range(0, len(profiles), chunk_points):
+            chunk = profiles[start:start + chunk_points]
+            X = np.empty((len(chunk) * n_activities, n_user + self.activity_features.shape[1]), dtype=np.float64)
+            X[:, :n_user - 1] = np.repeat(chunk, n_activities, axis=0)
+            X[:, n_user - 1] = np.repeat(assign_clusters(chunk), n_activities)
+            X[:, n_user:] = np.tile(self.activity_features, (len(chunk), 1))
+            ratings[start:start + len(chunk)] = predict(X).reshape(len(chunk), n_activities)
+        return ratings
+    
+    def distill_rating_table(self, bundle=None, grid=None, n_check=300, seed=42):
+        """Evaluate the model on a quantized profile grid and store it as a float16 RatingTable.
+        
+        Reports the table's error against the live model on random off-grid profiles
+        (scores in 0.25 steps) for interpolated and nearest-point lookup, plus its size.
+        Returns None if the model can't be distilled (no model, or a profile-only model).
+        """
+        bundle = bundle or self._serving_bundle()
+        n_features = len(self.USER_FEATURE_COLUMNS) + len(self.ACTIVITY_FEATURE_COLUMNS)
+        if (bundle is None or bundle.ml_model is None or len(self.activity_features) == 0 or
+                getattr(bundle.scaler_ml, 'n_features_in_', None) != n_features):
+            print("   ⚠️ Model can't be distilled into a rating table")
+            return None
+        
+        print(f"\n🧮 Distilling ML model into a profile-grid rating table...")
+        started = time.perf_counter()
+        
+        try:
+            axes = [np.arange(start, stop + step / 2, step, dtype=np.float64) for start, stop, step in (grid or self.DISTILL_GRID)]
+            profiles = np.stack(np.meshgrid(*axes, indexing='ij'), axis=-1).reshape(-1, len(axes))
+            assign_clusters, predict = self._bundle_predictor(bundle)
+            
+            ratings = self._predict_profiles(profiles, assign_clusters, predict)
+            table = RatingTable(
+                axes=axes,
+                table=ratings.astype(np.float16).reshape([len(axis) for axis in axes] + [len(self.activity_features)]),
+                activity_ids=self.activity_ids.copy()
+            )
+            
+            # Approximation error against the live model on random off-grid profiles
+            rng = np.random.default_rng(seed)
+            check = np.column_stack([
+                rng.integers(0, 41, n_check) / 4,
+                rng.integers(0, 41, n_check) / 4,
+                rng.integers(0, 41, n_check) / 4,
+                rng.uniform(axes[3][0], axes[3][-1], n_check),
+                rng.uniform(axes[4][0], axes[4][-1], n_check)
+            ])
+            live = self._predict_profiles(check, assign_clusters, predict)
+            interpolated = np.array([table.lookup(profile, interpolate=True) for profile in check])
+            nearest = np.array([table.lookup(profile, interpolate=False) for profile in check])
+            
+            table.report = {
+                'grid_shape': list(table.table.shape),
+                'grid_points': int(len(profiles)),
+                'table_bytes': table.nbytes,
+                'table_megabytes': round(table.nbytes / 2**20, 3),
+                'build_seconds': round(time.perf_counter() - started, 3),
+                'check_profiles': int(n_check),
+                'interpolated_mae': round(float(np.abs(interpolated - live).mean()), 4),
+                'interpolated_max_error': round(float(np.abs(interpolated - live).max()), 4),
+                'nearest_mae': round(float(np.abs(nearest - live).mean()), 4),
+                'nearest_max_error': round(float(np.abs(nearest - live).max()), 4),
+                'float16_max_error': round(float(np.abs(table.table.reshape(len(profiles), -1).astype(np.float64) - ratings).max()), 4)
+            }
+            
+            report = table.report
+            print(f"   ✅ Table {report['grid_shape']} = {report['table_megabytes']} MB in {report['build_seconds']}s")
+            print(f"   📏 Error vs live model: interpolated MAE {report['interpolated_mae']} (max {report['interpolated_max_error']}), "
+                  f"nearest MAE {report['nearest_mae']} (max {report['nearest_max_error']})")
+            return table
+            
+        except Exception as e:
+            print(f"   ❌ Rating table distillation failed: {e}")
+            traceback.print_exc()
+            return None
+    
+    def _serving_bundle(self):
+        """Live model bundle, or None until training or a load has published one.
+
+        Serving never reads the training attributes, which a background retrain
+        replaces while it runs.
+        """
+        return self.model_registry.current()
+    
+    def predict_activity_ratings(self, user_profile, bundle=None):
+        """Predict ratings for all activities with one batched model call.
+
+        Uses one consistent model bundle (default: the live one) for every step.
+        Returns (activity_ids, predicted_ratings, cluster_label) where the first two
+        are NumPy arrays aligned with self.activities rows, or None on failure.
+        """
+        bundle = bundle or self._serving_bundle()
+        if bundle is None or bundle.ml_model is None or bundle.kmeans_model is None or self.activities.empty:
             print("   ⚠️ Cannot make predictions")
-            return {}
+            return None
+        
+        scaler_cluster, scaler_ml = bundle.scaler_cluster, bundle.scaler_ml
+        compiled = bundle.compiled_forest if self.inference_backend == 'compiled' else None
         
         print("   🔮 Predicting activity ratings...")
         
@@ -1039,55 +2324,57 @@ class MentalHealthRecommender:
             cluster_features = [stress, anxiety, depression, sleep, steps]
             
             # FIX: Check if scaler_cluster is fitted
-            if not hasattr(self.scaler_cluster, 'mean_') or self.scaler_cluster.mean_ is None:
+            if compiled is not None and compiled.cluster_centers is not None:
+                cluster_label = compiled.assign_cluster(cluster_features)
+            elif not hasattr(scaler_cluster, 'mean_') or scaler_cluster.mean_ is None:
                 print("   ⚠️ Cluster scaler not fitted, using default cluster 0")
                 cluster_label = 0
             else:
-                cluster_features_scaled = self.scaler_cluster.transform([cluster_features])
-                cluster_label = int(self.kmeans_model.predict(cluster_features_scaled)[0])
+                cluster_features_scaled = scaler_cluster.transform([cluster_features])
+                cluster_label = int(bundle.kmeans_model.predict(cluster_features_scaled)[0])
             
             # Prepare ML features - FIX: Check if ML scaler is fitted
-            ml_features = cluster_features + [float(cluster_label)]
+            user_features = np.array(cluster_features + [float(cluster_label)], dtype=np.float64)
             
-            if not hasattr(self.scaler_ml, 'mean_') or self.scaler_ml.mean_ is None:
+            if not hasattr(scaler_ml, 'mean_') or scaler_ml.mean_ is None:
                 print("   ⚠️ ML scaler not fitted, cannot make predictions")
-                return {}
+                return None
             
-            ml_features_scaled = self.scaler_ml.transform([ml_features])
+            n_activities = len(self.activity_ids)
             
-            # Predict for all activities
-            activity_predictions = {}
+            table = bundle.rating_table if self.inference_backend == 'table' else None
+            if table is not None and table.matches(self.activity_ids):
+                # O(1) in the model size: read (and interpolate) the precomputed grid
+                predicted_ratings = table.lookup(cluster_features, interpolate=self.table_interpolation)
+                print(f"   ✅ Looked up ratings for {n_activities} activities in the rating table")
+                return self.activity_ids, predicted_ratings, cluster_label
             
-            for idx, activity in self.activities.iterrows():
-                try:
-                    activity_id = self._get_activity_id_from_activity(activity)
-                    
-                    # Predict rating
-                    predicted_rating = float(self.ml_model.predict(ml_features_scaled.reshape(1, -1))[0])
-                    
-                    activity_predictions[activity_id] = {
-                        'predicted_rating': predicted_rating,
-                        'activity_data': activity,
-                        'cluster': cluster_label
-                    }
-                    
-                except Exception as e:
-                    print(f"   ⚠️ Error predicting for activity {activity_id}: {e}")
-                    continue
+            if compiled is not None:
+                predict = compiled.predict
+            else:
+                predict = lambda rows: bundle.ml_model.predict(scaler_ml.transform(rows))
             
-            print(f"   ✅ Predicted ratings for {len(activity_predictions)} activities")
+            if len(scaler_ml.mean_) == len(user_features):
+                # Legacy profile-only model: one prediction shared by every activity
+                rating = float(predict(user_features.reshape(1, -1))[0])
+                predicted_ratings = np.full(n_activities, rating)
+            else:
+                # One (activities x features) matrix: the user profile next to each activity's features
+                X = np.empty((n_activities, len(user_features) + self.activity_features.shape[1]), dtype=np.float64)
+                X[:, :len(user_features)] = user_features
+                X[:, len(user_features):] = self.activity_features
+                predicted_ratings = predict(X)
             
-            if activity_predictions:
-                ratings = [pred['predicted_rating'] for pred in activity_predictions.values()]
-                if len(ratings) > 0:
-                    print(f"   📊 Rating range: {min(ratings):.2f} - {max(ratings):.2f}, std: {np.std(ratings):.3f}")
+            print(f"   ✅ Predicted ratings for {n_activities} activities")
+            if n_activities > 0:
+                print(f"   📊 Rating range: {predicted_ratings.min():.2f} - {predicted_ratings.max():.2f}, std: {predicted_ratings.std():.3f}")
             
-            return activity_predictions
+            return self.activity_ids, predicted_ratings, cluster_label
             
         except Exception as e:
             print(f"   ❌ ML prediction failed: {e}")
             traceback.print_exc()
-            return {}
+            return None
     
     def get_recommendations(self, user_input, top_n=5, use_ml=True):
         """Get activity recommendations - ULTRA ROBUST VERSION"""
@@ -1111,37 +2398,22 @@ class MentalHealthRecommender:
         if use_ml:
             print("   🤖 Using ML-based recommendations...")
             try:
-                # Ensure basic models exist
-                if self.ml_model is None or self.kmeans_model is None:
-                    print("   ⚠️ Models missing, creating basic ones...")
-                    self.ensure_basic_models()
-                
-                # Check if scalers are fitted
-                if not hasattr(self.scaler_cluster, 'mean_') or self.scaler_cluster.mean_ is None:
-                    print("   ⚠️ Cluster scaler not fitted, fitting with defaults...")
-                    # Fit with some default data
-                    default_data = [[5.0, 5.0, 5.0, 7.0, 5000.0]]
-                    self.scaler_cluster.fit(default_data)
-                
-                activity_predictions = self.predict_activity_ratings(user_profile)
+                # One snapshot for the whole request, even if a retrain swaps models meanwhile
+                bundle = self._serving_bundle()
+                predictions = self.predict_activity_ratings(user_profile, bundle)
                 
-                if activity_predictions:
-                    # Sort by rating
-                    sorted_predictions = sorted(
-                        activity_predictions.items(),
-                        key=lambda x: x[1]['predicted_rating'],
-                        reverse=True
-                    )
+                if predictions is not None and len(predictions[0]) > 0 and top_n > 0:
+                    activity_ids, predicted_ratings, cluster_label = predictions
                     
-                    # Get top activities
+                    # Get top activities (top N by predicted rating without sorting every activity)
                     activities = []
-                    for activity_id, prediction_data in sorted_predictions[:top_n]:
-                        activity = self.get_activity_by_id(activity_id)
-                        if activity is not None:
-                            formatted_activity = self.format_activity(activity)
-                            formatted_activity['predicted_rating'] = float(prediction_data['predicted_rating'])
-                            formatted_activity['predicted_cluster'] = int(prediction_data['cluster'])
-                            activities.append(formatted_activity)
+                    for position in top_k(predicted_ratings, top_n):
+                        activity = self.activities.iloc[position]
+                        formatted_activity = self.format_activity(activity)
+                        formatted_activity['predicted_rating'] = float(predicted_ratings[position])
+                        formatted_activity['predicted_cluster'] = int(cluster_label)
+                        formatted_activity['model_version'] = bundle.version
+                        activities.append(formatted_activity)
                     
                     if activities:
                         print(f"   ✅ ML model recommended {len(activities)} activities")
@@ -1239,33 +2511,25 @@ class MentalHealthRecommender:
                 print(f"   • {activity_name}: {count} ratings, avg {avg_rating:.2f}/5")
     
     def continuous_learning_check(self):
-        """Check if we should retrain with new ratings"""
+        """Check if we should retrain with new ratings (or train initial models if none is published)"""
         try:
-            if not self.ratings_db_path:
-                return False
-            
-            # Check when models were last trained
-            model_time = os.path.getmtime(os.path.join(self.model_path, 'ml_model.pkl')) if os.path.exists(os.path.join(self.model_path, 'ml_model.pkl')) else 0
-            
-            # Check for new ratings since last training
-            conn = sqlite3.connect(self.ratings_db_path)
-            cursor = conn.cursor()
+            if self.model_registry.current() is None:
+                print("\n📚 No model published yet, training initial models...")
+                return self.initialize_ml_models()
             
-            if model_time > 0:
-                last_train_time = datetime.fromtimestamp(model_time)
-                cursor.execute('''
-                SELECT COUNT(*) FROM activity_ratings 
-                WHERE timestamp > ?
-                ''', (last_train_time.isoformat(),))
-            else:
-                cursor.execute('SELECT COUNT(*) FROM activity_ratings')
+            if self.ratings_db is None:
+                return False
             
-            new_ratings = cursor.fetchone()[0]
-            conn.close()
+            # Count ratings added since the model last folded them in
+            with self.ratings_db.reader() as conn:
+                new_ratings = conn.execute(
+                    'SELECT COUNT(*) FROM activity_ratings WHERE id > ?',
+                    (int(self.training_state.get('rating_watermark', 0)),)
+                ).fetchone()[0]
             
             if new_ratings >= 10:
-                print(f"\n🔄 {new_ratings} new ratings detected, triggering retraining...")
-                success = self.train_ml_model()
+                print(f"\n🔄 {new_ratings} new ratings detected, updating model...")
+                success = self.update_ml_model_incremental()
                 if success:
                     print("✅ Models updated with new learnings")
                     self.generate_learning_insights()
@@ -1277,34 +2541,50 @@ class MentalHealthRecommender:
             print(f"⚠️ Error in continuous learning check: {e}")
             return False
     
+    def load_or_schedule_training(self):
+        """Serve the published model artifact, else train initial models on the retrain worker.
+        
+        Returns immediately: True if a model was loaded, False if training was scheduled.
+        """
+        if self.load_models():
+            return True
+        print("   📚 No published model, initial training scheduled in the background")
+        self.retrain_worker.request(immediate=True)
+        return False
+    
     def save_user_rating(self, user_id, activity_id, rating, user_profile=None):
-        """Save a user rating and trigger learning if needed"""
+        """Save a user rating and schedule a background learning check"""
         success = self._save_real_rating(user_id, activity_id, rating, user_profile)
         
         if success:
-            # Check if we should retrain
-            self.continuous_learning_check()
+            # Debounced retrain check off the request thread
+            self.retrain_worker.request()
         
         return success
     
+    def get_retraining_status(self):
+        """Background retraining status (JSON-serializable, e.g. for a status endpoint)"""
+        status = self.retrain_worker.status()
+        status['real_ratings'] = self._count_ratings()
+        return status
+    
     def get_activity_by_id(self, activity_id):
-        """Get activity by ID"""
+        """Get activity by ID (read-only mapping of the activity's row)"""
         if self.activities.empty:
             return None
         
         try:
             activity_id_int = int(activity_id)
             
-            if '_activity_id' in self.activities.columns:
-                activity_match = self.activities[self.activities['_activity_id'] == activity_id_int]
-                if not activity_match.empty:
-                    return activity_match.iloc[0]
+            position = self._activity_position(activity_id_int)
+            if position is not None:
+                return self._activity_records[position]
             
-            if 0 <= activity_id_int - 1 < len(self.activities):
-                return self.activities.iloc[activity_id_int - 1]
+            if 0 <= activity_id_int - 1 < len(self._activity_records):
+                return self._activity_records[activity_id_int - 1]
             
-            if len(self.activities) > 0:
-                return self.activities.iloc[0]
+            if len(self._activity_records) > 0:
+                return self._activity_records[0]
             
         except Exception as e:
             print(f"   ⚠️ Error getting activity: {e}")